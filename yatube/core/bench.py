@@ -0,0 +1,13 @@
+"""Общее для команд-бенчмарков."""
+import statistics
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+def quantile(latencies, percent):
+    """Перцентиль задержек в миллисекундах."""
+    if len(latencies) < 2:
+        return sum(latencies) * 1000
+    return statistics.quantiles(latencies, n=100)[percent - 1] * 1000
@@ -0,0 +1,153 @@
+"""Кэш страниц с инвалидацией по версиям и защитой от лавины промахов."""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.views.decorators.http import condition
+
+from .routers import REPLICA_SCOPE, reading_replica
+from .timing import record
+
+VERSION_KEY = 'version:{}'
+PAGE_KEY = 'page:{}'
+LOCK_KEY = 'lock:{}'
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL = 0.05
+EARLY_EXPIRATION_BETA = 1.0
+
+
+def new_version():
+    # Версия начинается с текущего времени, чтобы после вытеснения ключа
+    # из кэша не вернуться к одной из прежних версий.
+    return time.time_ns() // 1000
+
+
+def get_versions(*scopes):
+    """Текущие версии областей кэша одним обращением к кэшу."""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, settings.CACHE_VERSION_TIMEOUT)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    """Делает устаревшим все, что закэшировано для областей scopes."""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_version(), settings.CACHE_VERSION_TIMEOUT)
+
+
+def expires_early(delta, expiry, beta=EARLY_EXPIRATION_BETA):
+    """Вероятностное досрочное устаревание (XFetch).
+
+    Чем ближе срок жизни записи и чем дольше она строится (delta), тем
+    вероятнее, что один из запросов перестроит ее заранее.
+    """
+    return time.time() - delta * beta * math.log(1 - random.random()) >= expiry
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT,
+                   cacheable=lambda value: True):
+    """Значение из кэша; при промахе его строит только один процесс.
+
+    Остальные запросы в это время получают прежнее значение, а если его
+    нет - ждут результата не дольше LOCK_WAIT секунд.
+    """
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = cache.default_timeout
+    lock = LOCK_KEY.format(key)
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expiry = entry
+        if expiry is None or not expires_early(delta, expiry):
+            record('cache_hit')
+            return value
+        if not cache.add(lock, True, LOCK_TIMEOUT):
+            record('cache_hit')
+            return value
+    elif not cache.add(lock, True, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            entry = cache.get(key)
+            if entry is not None:
+                record('cache_hit')
+                return entry[0]
+        record('cache_miss')
+        return compute()
+    record('cache_miss')
+    try:
+        started = time.monotonic()
+        value = compute()
+        if cacheable(value):
+            cache.set(key, (
+                value,
+                time.monotonic() - started,
+                None if timeout is None else time.time() + timeout
+            ), timeout)
+        return value
+    finally:
+        cache.delete(lock)
+
+
+def page_key(request, scopes):
+    # Страницы, построенные по реплике, устаревают и после ее обновления.
+    if reading_replica():
+        scopes = [*scopes, REPLICA_SCOPE]
+    return PAGE_KEY.format(hashlib.md5(repr((
+        request.get_full_path(),
+        request.user.pk,
+        get_versions(*scopes),
+    )).encode()).hexdigest())
+
+
+def versioned_cache_page(*scopes, timeout=DEFAULT_TIMEOUT):
+    """Кэширует страницу, пока не изменится версия одной из областей.
+
+    Области - строки формата, в которые подставляются аргументы
+    представления: versioned_cache_page('posts', 'group:{slug}').
+    Страница кэшируется отдельно для каждого пользователя и строится
+    через get_or_compute.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            return get_or_compute(
+                page_key(
+                    request, [scope.format(**kwargs) for scope in scopes]
+                ),
+                lambda: view(request, *args, **kwargs),
+                timeout,
+                lambda response: (
+                    response.status_code == 200 and not response.streaming
+                )
+            )
+        return wrapper
+    return decorator
+
+
+def versioned_etag(*scopes):
+    """Отвечает 304 на повторный запрос, если версии областей не менялись.
+
+    ETag считается по версиям из кэша до вызова представления, поэтому
+    при совпадении не выполняются ни запросы к базе, ни шаблоны.
+    """
+    def etag(request, *args, **kwargs):
+        return page_key(
+            request, [scope.format(**kwargs) for scope in scopes]
+        ).split(':')[-1]
+    return condition(etag_func=etag)
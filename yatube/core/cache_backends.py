@@ -0,0 +1,264 @@
+"""Общий для всех процессов сервера кэш в файле SQLite."""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_stats SET entries = entries + 1, size = size + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_stats SET entries = entries - 1, size = size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache BEGIN
+    UPDATE cache_stats SET size = size - old.size + new.size;
+END;
+'''
+
+
+class SQLiteCache(BaseCache):
+    """Кэш с LRU-вытеснением, ограничениями по числу записей и объему.
+
+    Все процессы сервера работают с одним файлом (LOCATION) в режиме WAL,
+    поэтому страница, закэшированная одним воркером, видна остальным.
+    Параметры OPTIONS:
+    MAX_ENTRIES - наибольшее число записей;
+    MAX_SIZE - наибольший суммарный объем значений в байтах (0 - без
+    ограничения);
+    CULL_FREQUENCY - при переполнении вытесняется 1/CULL_FREQUENCY записей;
+    ACCESS_RESOLUTION - как часто (в секундах) обновлять время последнего
+    обращения к записи при чтении.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 0))
+        self._access_resolution = float(options.get('ACCESS_RESOLUTION', 1))
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def _write(self, callback):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = callback(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def _put(self, connection, key, value, timeout, now):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        connection.execute(
+            'INSERT INTO cache VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires, accessed = excluded.accessed, '
+            'size = excluded.size',
+            (key, data, self.get_backend_timeout(timeout), now, len(data))
+        )
+
+    def _cull(self, connection, now):
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        if entries <= self._max_entries and (
+            not self._max_size or size <= self._max_size
+        ):
+            return
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        while True:
+            entries, size = connection.execute(
+                'SELECT entries, size FROM cache_stats'
+            ).fetchone()
+            if not entries or entries <= self._max_entries and (
+                not self._max_size or size <= self._max_size
+            ):
+                return
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(
+                    entries - self._max_entries,
+                    entries // self._cull_frequency if self._cull_frequency
+                    else entries,
+                    1
+                ),)
+            )
+
+    def _read(self, keys):
+        now = time.time()
+        rows = self._connection.execute(
+            'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({", ".join("?" * len(keys))})',
+            keys
+        ).fetchall()
+        found, expired, touched = {}, [], []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append(key)
+                continue
+            found[key] = pickle.loads(value)
+            if now - accessed >= self._access_resolution:
+                touched.append(key)
+        if expired or touched:
+            def update(connection):
+                connection.executemany(
+                    'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                    [(key, now) for key in expired]
+                )
+                connection.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in touched]
+                )
+            self._write(update)
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._read([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        keys_map = {
+            self.make_and_validate_key(key, version=version): key
+            for key in keys
+        }
+        return {
+            keys_map[key]: value
+            for key, value in self._read(list(keys_map)).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+
+        def store(connection):
+            self._put(connection, key, value, timeout, now)
+            self._cull(connection, now)
+        self._write(store)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        items = [
+            (self.make_and_validate_key(key, version=version), value)
+            for key, value in data.items()
+        ]
+
+        def store(connection):
+            for key, value in items:
+                self._put(connection, key, value, timeout, now)
+            self._cull(connection, now)
+        self._write(store)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+
+        def store(connection):
+            row = connection.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row and (row[0] is None or row[0] > now):
+                return False
+            self._put(connection, key, value, timeout, now)
+            self._cull(connection, now)
+            return True
+        return self._write(store)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        return self._write(lambda connection: connection.execute(
+            'UPDATE cache SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now)
+        ).rowcount == 1)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+
+        def increment(connection):
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?',
+                (data, len(data), now, key)
+            )
+            return value
+        return self._write(increment)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write(lambda connection: connection.execute(
+            'DELETE FROM cache WHERE key = ?', (key,)
+        ).rowcount == 1)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version)
+                for key in keys]
+        self._write(lambda connection: connection.executemany(
+            'DELETE FROM cache WHERE key = ?', [(key,) for key in keys]
+        ))
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._write(lambda connection: connection.execute(
+            'DELETE FROM cache'
+        ))
@@ -0,0 +1,61 @@
+"""Настройка соединений SQLite и обновление реплики."""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .cache import bump
+from .routers import REPLICA, REPLICA_SCOPE
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Выполняет PRAGMA из settings.SQLITE_PRAGMAS для нового соединения.
+
+    Благодаря режиму WAL читатели не ждут пишущую транзакцию, а
+    busy_timeout заставляет писателей ждать блокировку, а не падать с
+    «database is locked». Вместе с CONN_MAX_AGE настройка выполняется один
+    раз на соединение, а не на каждый запрос.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def data_version():
+    """Меняется, когда другие соединения фиксируют изменения в базе."""
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('PRAGMA data_version')
+        return cursor.fetchone()[0]
+
+
+def sync_replica():
+    """Копирует основную базу в реплику онлайн-бэкапом SQLite.
+
+    Бэкап идет одним шагом, поэтому реплика получает согласованный снимок;
+    в режиме WAL запись в основную базу в это время не блокируется.
+    """
+    source, target = connections[DEFAULT_DB_ALIAS], connections[REPLICA]
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
+    bump(REPLICA_SCOPE)
+
+
+@contextmanager
+def use_database(name, **options):
+    """Временно переключает соединение default на другую базу.
+
+    Нужно бенчмаркам, которые заполняют отдельную временную базу.
+    """
+    database = connections.settings[DEFAULT_DB_ALIAS]
+    original = dict(database)
+    connections.close_all()
+    database.update(NAME=name, **options)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        database.clear()
+        database.update(original)
@@ -0,0 +1,130 @@
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from core.cache_backends import SQLiteCache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.core.management.commands.createcachetable import \
+    Command as CreateCacheTable
+from django.db import connection, connections
+
+BENCH_TABLE = 'bench_cache_table'
+BACKENDS = ('locmem', 'db', 'sqlite')
+
+
+def make_cache(backend, location, options):
+    params = {'TIMEOUT': 300, 'OPTIONS': options}
+    if backend == 'locmem':
+        return LocMemCache('bench', params)
+    if backend == 'db':
+        return DatabaseCache(BENCH_TABLE, params)
+    return SQLiteCache(location, params)
+
+
+def worker(backend, location, options, keys, requests, render_ms,
+           value_size, seed):
+    """Имитирует воркер, который отдает страницы из кэша."""
+    connections.close_all()
+    cache = make_cache(backend, location, options)
+    chooser = random.Random(seed)
+    weights = [1 / rank for rank in range(1, keys + 1)]
+    pages = chooser.choices(range(keys), weights, k=requests)
+    value = os.urandom(value_size)
+    latencies, hits = [], 0
+    started = time.perf_counter()
+    for page in pages:
+        begin = time.perf_counter()
+        if cache.get(f'page:{page}') is None:
+            time.sleep(render_ms / 1000)
+            cache.set(f'page:{page}', value)
+        else:
+            hits += 1
+        latencies.append(time.perf_counter() - begin)
+    return hits, latencies, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает LocMemCache, DatabaseCache и SQLiteCache '
+            'под нагрузкой нескольких процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Запросов на процесс.')
+        parser.add_argument('--keys', type=int, default=500,
+                            help='Число разных страниц (распределение Ципфа).')
+        parser.add_argument('--render-ms', type=float, default=5,
+                            help='Время построения страницы при промахе.')
+        parser.add_argument('--value-size', type=int, default=20000)
+        parser.add_argument('--max-entries', type=int, default=300)
+        parser.add_argument('--backends', nargs='+', choices=BACKENDS,
+                            default=list(BACKENDS))
+        parser.add_argument('--json', help='Файл для результатов.')
+
+    def handle(self, *args, **options):
+        cache_options = {'MAX_ENTRIES': options['max_entries']}
+        if 'db' in options['backends']:
+            creator = CreateCacheTable()
+            creator.verbosity = 0
+            creator.create_table(connection.alias, BENCH_TABLE, False)
+        results = {}
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                location = os.path.join(directory, 'bench_cache.sqlite3')
+                for backend in options['backends']:
+                    results[backend] = self.run(
+                        backend, location, cache_options, options
+                    )
+        finally:
+            if 'db' in options['backends']:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'DROP TABLE IF EXISTS '
+                        f'{connection.ops.quote_name(BENCH_TABLE)}'
+                    )
+        self.stdout.write(
+            f'{"backend":<8} {"hit rate":>9} {"req/s":>9} '
+            f'{"p50, ms":>8} {"p99, ms":>8}'
+        )
+        for backend, result in results.items():
+            self.stdout.write(
+                f'{backend:<8} {result["hit_rate"]:>9.1%} '
+                f'{result["throughput"]:>9.0f} '
+                f'{result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f}'
+            )
+        if options['json']:
+            with open(options['json'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def run(self, backend, location, cache_options, options):
+        processes = options['processes']
+        context = multiprocessing.get_context('fork')
+        with context.Pool(processes) as pool:
+            outcomes = pool.starmap(worker, [
+                (backend, location, cache_options, options['keys'],
+                 options['requests'], options['render_ms'],
+                 options['value_size'], seed)
+                for seed in range(processes)
+            ])
+        latencies = sorted(
+            latency for _, worker_latencies, _ in outcomes
+            for latency in worker_latencies
+        )
+        quantiles = statistics.quantiles(latencies, n=100)
+        total = processes * options['requests']
+        return {
+            'processes': processes,
+            'requests': total,
+            'hit_rate': sum(hits for hits, _, _ in outcomes) / total,
+            'throughput': total / max(
+                elapsed for _, _, elapsed in outcomes
+            ),
+            'p50_ms': quantiles[49] * 1000,
+            'p99_ms': quantiles[98] * 1000,
+        }
@@ -0,0 +1,238 @@
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import Counter
+from importlib import import_module
+
+from core.bench import DUMMY_CACHES, quantile
+from core.db import use_database
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from posts.models import Follow, Group, Post
+
+URL_MODULES = ('posts', 'users', 'about')
+CLIENTS = ('anonymous', 'user')
+# Выход разлогинил бы пользователя для всех следующих запросов, а
+# подписка и отписка меняют данные: повторный запрос мерил бы уже другое.
+SKIPPED = {
+    ('users:logout', 'user'),
+    ('posts:profile_follow', 'user'),
+    ('posts:profile_unfollow', 'user'),
+}
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, cwd=settings.BASE_DIR, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Сквозной бенчмарк: заполняет временную базу и прогоняет все '
+            'адреса posts, users и about через WSGI-приложение от имени '
+            'гостя и пользователя.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--comments', type=float, default=2,
+                            help='Комментариев на пост в среднем.')
+        parser.add_argument('--follows', type=float, default=20,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Запросов на каждый адрес.')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Запросов на адрес до замеров.')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Отключить кэш (DummyCache).')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', help='Файл для результатов.')
+        parser.add_argument('--compare',
+                            help='JSON прошлого прогона для сравнения.')
+
+    def handle(self, *args, **options):
+        overrides = {'ALLOWED_HOSTS': ['testserver']}
+        if options['no_cache']:
+            overrides['CACHES'] = DUMMY_CACHES
+        with tempfile.TemporaryDirectory() as directory, \
+                use_database(os.path.join(directory, 'bench.sqlite3')), \
+                override_settings(**overrides):
+            started = time.perf_counter()
+            follow = self.seed(options)
+            seed_seconds = time.perf_counter() - started
+            routes = self.run(self.routes(follow), follow.user, options)
+        total = sum(result['requests'] for result in routes.values())
+        seconds = sum(result['seconds'] for result in routes.values())
+        results = {
+            'commit': current_commit(),
+            'options': {
+                name: options[name] for name in (
+                    'users', 'posts', 'groups', 'comments', 'follows',
+                    'requests', 'warmup', 'no_cache', 'seed'
+                )
+            },
+            'seed_seconds': seed_seconds,
+            'requests': total,
+            'requests_per_second': total / seconds if seconds else 0,
+            'routes': routes,
+        }
+        self.report(results, self.load(options['compare']))
+        if options['json']:
+            with open(options['json'], 'w') as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
+
+    def seed(self, options):
+        """Заполняет базу и возвращает подписку, от имени читателя
+        которой идут запросы."""
+        call_command('migrate', verbosity=0)
+        call_command(
+            'generate_data',
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=int(options['posts'] * options['comments']),
+            follows=options['follows'],
+            seed=options['seed'],
+            stdout=self.stdout,
+        )
+        follow = Follow.objects.select_related('user', 'author').order_by(
+            'id'
+        ).first()
+        if follow is None:
+            raise CommandError(
+                'Генератор не создал подписок: увеличьте --users и --follows.'
+            )
+        return follow
+
+    def routes(self, follow):
+        """Имя и адрес каждого маршрута posts, users и about."""
+        user = follow.user
+        post = Post.objects.filter(author=user).first() or Post.objects.first()
+        values = {
+            'slug': Group.objects.first().slug,
+            'username': follow.author.username,
+            'post_id': post.id,
+            'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+            'token': default_token_generator.make_token(user),
+        }
+        routes = {}
+        for module in URL_MODULES:
+            urls = import_module(f'{module}.urls')
+            for pattern in urls.urlpatterns:
+                name = f'{urls.app_name}:{pattern.name}'
+                routes[name] = reverse(name, kwargs={
+                    key: values[key] for key in pattern.pattern.converters
+                })
+        return routes
+
+    def request(self, application, path, cookies):
+        environ = RequestFactory().get(path, HTTP_COOKIE=cookies).environ
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split()[0])
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count):
+            body = application(environ, start_response)
+            try:
+                size = sum(len(chunk) for chunk in body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        return (time.perf_counter() - started, len(queries), size,
+                response['status'])
+
+    def run(self, routes, user, options):
+        application = get_wsgi_application()
+        session = Client()
+        session.force_login(user)
+        cookies = {
+            'anonymous': '',
+            'user': '; '.join(
+                f'{name}={morsel.value}'
+                for name, morsel in session.cookies.items()
+            ),
+        }
+        results = {}
+        for name, path in routes.items():
+            for client in CLIENTS:
+                if (name, client) in SKIPPED:
+                    continue
+                for _ in range(options['warmup']):
+                    self.request(application, path, cookies[client])
+                samples = [
+                    self.request(application, path, cookies[client])
+                    for _ in range(options['requests'])
+                ]
+                latencies = [sample[0] for sample in samples]
+                seconds = sum(latencies)
+                results[f'{name} {client}'] = {
+                    'path': path,
+                    'requests': len(samples),
+                    'seconds': seconds,
+                    'requests_per_second': len(samples) / seconds,
+                    'p50_ms': quantile(latencies, 50),
+                    'p95_ms': quantile(latencies, 95),
+                    'p99_ms': quantile(latencies, 99),
+                    'queries': statistics.mean(
+                        sample[1] for sample in samples
+                    ),
+                    'bytes': statistics.mean(sample[2] for sample in samples),
+                    'statuses': dict(Counter(
+                        str(sample[3]) for sample in samples
+                    )),
+                }
+        return results
+
+    def load(self, path):
+        if not path:
+            return {}
+        with open(path) as file:
+            return json.load(file)['routes']
+
+    def report(self, results, previous):
+        self.stdout.write(
+            f'commit {results["commit"]}, {results["requests"]} requests, '
+            f'{results["requests_per_second"]:.1f} req/s'
+        )
+        self.stdout.write(
+            f'{"route":<42} {"status":>9} {"p50":>7} {"p95":>7} {"p99":>7} '
+            f'{"queries":>7} {"KB":>6} {"req/s":>7}'
+            + (f' {"Δp95":>7}' if previous else '')
+        )
+        for name, result in results['routes'].items():
+            line = (
+                f'{name:<42} '
+                f'{",".join(result["statuses"]):>9} '
+                f'{result["p50_ms"]:>7.1f} {result["p95_ms"]:>7.1f} '
+                f'{result["p99_ms"]:>7.1f} {result["queries"]:>7.1f} '
+                f'{result["bytes"] / 1024:>6.1f} '
+                f'{result["requests_per_second"]:>7.1f}'
+            )
+            if previous.get(name, {}).get('p95_ms'):
+                change = result['p95_ms'] / previous[name]['p95_ms'] - 1
+                line += f' {change:>+7.0%}'
+            self.stdout.write(line)
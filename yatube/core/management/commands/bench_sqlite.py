@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from core.bench import DUMMY_CACHES, quantile
+from core.db import use_database
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import (DEFAULT_DB_ALIAS, OperationalError, connection,
+                       connections)
+from django.test import Client, override_settings
+from django.urls import reverse
+from posts.models import Post
+
+User = get_user_model()
+MODES = ('default', 'tuned')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест SQLite: потоки читают главную страницу и '
+            'создают посты; сравнивает настройки по умолчанию с WAL, '
+            'PRAGMA из SQLITE_PRAGMAS и постоянными соединениями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Длительность каждого прогона, секунд.')
+        parser.add_argument('--posts', type=int, default=1000,
+                            help='Постов в базе перед прогоном.')
+        parser.add_argument('--json', help='Файл для результатов.')
+
+    def handle(self, *args, **options):
+        conn_max_age = settings.DATABASES[DEFAULT_DB_ALIAS]['CONN_MAX_AGE']
+        results = {}
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(ALLOWED_HOSTS=['testserver'],
+                                  CACHES=DUMMY_CACHES):
+            for mode in MODES:
+                with use_database(
+                    os.path.join(directory, f'{mode}.sqlite3'),
+                    CONN_MAX_AGE=(
+                        0 if mode == 'default' else conn_max_age or 600
+                    )
+                ), override_settings(SQLITE_PRAGMAS=(
+                    {} if mode == 'default' else settings.SQLITE_PRAGMAS
+                )):
+                    results[mode] = self.run(options)
+        self.stdout.write(
+            f'{"mode":<8} {"reads/s":>8} {"writes/s":>9} {"errors":>7} '
+            f'{"read p50":>9} {"read p95":>9} {"write p95":>10}  (ms)'
+        )
+        for mode, result in results.items():
+            self.stdout.write(
+                f'{mode:<8} {result["reads_per_second"]:>8.1f} '
+                f'{result["writes_per_second"]:>9.1f} '
+                f'{result["errors"]:>7} {result["read_p50_ms"]:>9.1f} '
+                f'{result["read_p95_ms"]:>9.1f} '
+                f'{result["write_p95_ms"]:>10.1f}'
+            )
+        if options['json']:
+            with open(options['json'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def seed(self, options):
+        call_command('migrate', verbosity=0)
+        author = User.objects.create_user(username='bench_author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост для нагрузочного теста {number}', author=author)
+            for number in range(options['posts'])
+        )
+        return [
+            User.objects.create_user(username=f'bench_writer_{number}')
+            for number in range(options['writers'])
+        ]
+
+    def measure(self, request, latencies, expected):
+        started = time.perf_counter()
+        try:
+            status = request().status_code
+        except OperationalError:
+            status = None
+        with self.lock:
+            if status == expected:
+                latencies.append(time.perf_counter() - started)
+            else:
+                self.errors.append(status)
+
+    def reader(self, url):
+        client = Client()
+        try:
+            while time.monotonic() < self.deadline:
+                self.measure(lambda: client.get(url), self.reads, 200)
+        finally:
+            connection.close()
+
+    def writer(self, url, user):
+        client = Client()
+        client.force_login(user)
+        try:
+            while time.monotonic() < self.deadline:
+                self.measure(lambda: client.post(
+                    url, {'text': 'Пост из нагрузочного теста'}
+                ), self.writes, 302)
+        finally:
+            connection.close()
+
+    def run(self, options):
+        writers = self.seed(options)
+        connections.close_all()
+        self.reads, self.writes, self.errors = [], [], []
+        self.lock = threading.Lock()
+        self.deadline = time.monotonic() + options['duration']
+        threads = [
+            threading.Thread(target=self.reader, args=(
+                reverse('posts:index'),
+            ))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=self.writer, args=(
+                reverse('posts:post_create'), user
+            ))
+            for user in writers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'readers': options['readers'],
+            'writers': options['writers'],
+            'reads': len(self.reads),
+            'writes': len(self.writes),
+            'errors': len(self.errors),
+            'reads_per_second': len(self.reads) / options['duration'],
+            'writes_per_second': len(self.writes) / options['duration'],
+            'read_p50_ms': quantile(self.reads, 50),
+            'read_p95_ms': quantile(self.reads, 95),
+            'write_p95_ms': quantile(self.writes, 95),
+        }
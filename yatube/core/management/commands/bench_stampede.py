@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+from collections import Counter
+
+from core.cache import get_or_compute
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from posts.models import Post
+
+BENCH_KEY = 'bench:stampede'
+MODES = ('naive', 'protected')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест на границе истечения кэша: сколько раз '
+            'страница перестраивается без защиты и с get_or_compute.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=5,
+                            help='Длительность каждого прогона, секунд.')
+        parser.add_argument('--timeout', type=float, default=1,
+                            help='Срок жизни записи в кэше, секунд.')
+        parser.add_argument('--render-ms', type=float, default=50,
+                            help='Время построения страницы.')
+        parser.add_argument('--bucket-ms', type=float, default=100)
+        parser.add_argument('--json', help='Файл для результатов.')
+
+    def handle(self, *args, **options):
+        results = {mode: self.run(mode, options) for mode in MODES}
+        self.stdout.write(
+            f'{"mode":<10} {"renders":>8} {"queries/s":>10} '
+            f'{"peak per bucket":>16}'
+        )
+        for mode, result in results.items():
+            self.stdout.write(
+                f'{mode:<10} {result["renders"]:>8} '
+                f'{result["queries_per_second"]:>10.1f} '
+                f'{result["peak_per_bucket"]:>16}'
+            )
+        if options['json']:
+            with open(options['json'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def run(self, mode, options):
+        cache.delete(BENCH_KEY)
+        renders = []
+        lock = threading.Lock()
+        started = time.monotonic()
+        deadline = started + options['duration']
+
+        def render():
+            Post.objects.count()
+            time.sleep(options['render_ms'] / 1000)
+            with lock:
+                renders.append(time.monotonic() - started)
+            return 'page'
+
+        def naive():
+            if cache.get(BENCH_KEY) is None:
+                cache.set(BENCH_KEY, render(), options['timeout'])
+
+        def protected():
+            get_or_compute(BENCH_KEY, render, options['timeout'])
+
+        request = naive if mode == 'naive' else protected
+
+        def client():
+            try:
+                while time.monotonic() < deadline:
+                    request()
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=client)
+            for _ in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        buckets = Counter(
+            int(moment * 1000 // options['bucket_ms']) for moment in renders
+        )
+        return {
+            'threads': options['threads'],
+            'renders': len(renders),
+            'queries_per_second': len(renders) / options['duration'],
+            'peak_per_bucket': max(buckets.values(), default=0),
+            'per_bucket': [
+                buckets.get(bucket, 0) for bucket in range(
+                    int(options['duration'] * 1000 // options['bucket_ms'])
+                    + 1
+                )
+            ],
+        }
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db import data_version, sync_replica
+from core.routers import REPLICA
+
+
+class Command(BaseCommand):
+    help = ('Обновляет реплику (DB_REPLICA_NAME) копией основной базы '
+            'SQLite; с --interval - периодически, если база менялась.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Период проверки, секунд (0 - один раз).')
+
+    def handle(self, *args, **options):
+        if REPLICA not in settings.DATABASES:
+            raise CommandError(
+                'Реплика не настроена: задайте DB_REPLICA_NAME.'
+            )
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('Реплика поддерживается только для SQLite.')
+        synced = None
+        while True:
+            version = data_version()
+            if version != synced:
+                started = time.perf_counter()
+                sync_replica()
+                synced = version
+                self.stdout.write(
+                    f'Реплика обновлена за '
+                    f'{(time.perf_counter() - started) * 1000:.0f} мс'
+                )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,283 @@
+"""Счетчики и гистограммы запросов в текстовом формате Prometheus.
+
+Каждый процесс пишет свои значения в собственный файл METRICS_DIR,
+отображенный в память (metrics_<pid>.db): запись - это изменение числа
+по известному смещению, без блокировок между процессами. Эндпоинт
+читает файлы всех процессов и складывает значения, поэтому счетчики
+суммируются по всем воркерам, в том числе уже завершившимся. Без
+METRICS_DIR значения хранятся в памяти процесса.
+"""
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf
+)
+FILE_PATTERN = 'metrics_{}.db'
+HEADER = struct.Struct('<I4x')
+LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+UNRESOLVED = '<unresolved>'
+
+
+def padded(length):
+    """Длина ключа с выравниванием значения по 8 байтам."""
+    return length + (-(LENGTH.size + length) % 8)
+
+
+def read_entries(buffer):
+    """Ключи, значения и смещения значений в буфере файла метрик."""
+    used, = HEADER.unpack_from(buffer, 0)
+    position = HEADER.size
+    while position < used:
+        length, = LENGTH.unpack_from(buffer, position)
+        key = bytes(
+            buffer[position + LENGTH.size:position + LENGTH.size + length]
+        ).decode()
+        position += LENGTH.size + padded(length)
+        yield key, VALUE.unpack_from(buffer, position)[0], position
+        position += VALUE.size
+
+
+class MmapValues:
+    """Числа float64 по строковым ключам в файле, отображенном в память.
+
+    Новая запись сначала пишется целиком и только потом учитывается в
+    заголовке, так что читатель из другого процесса не увидит ее
+    наполовину.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'a+b')
+        size = os.fstat(self.file.fileno()).st_size
+        if size == 0:
+            self.file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self.map = mmap.mmap(self.file.fileno(), size)
+        if HEADER.unpack_from(self.map, 0)[0] == 0:
+            HEADER.pack_into(self.map, 0, HEADER.size)
+        self.offsets = {
+            key: offset for key, _, offset in read_entries(self.map)
+        }
+        self.used = HEADER.unpack_from(self.map, 0)[0]
+
+    def add(self, key, amount):
+        offset = self.offsets.get(key)
+        if offset is None:
+            offset = self.insert(key)
+        value, = VALUE.unpack_from(self.map, offset)
+        VALUE.pack_into(self.map, offset, value + amount)
+
+    def insert(self, key):
+        encoded = key.encode()
+        size = LENGTH.size + padded(len(encoded)) + VALUE.size
+        if self.used + size > len(self.map):
+            capacity = len(self.map)
+            while self.used + size > capacity:
+                capacity *= 2
+            self.map.close()
+            self.file.truncate(capacity)
+            self.map = mmap.mmap(self.file.fileno(), capacity)
+        struct.pack_into(
+            f'<I{padded(len(encoded))}sd', self.map, self.used,
+            len(encoded), encoded, 0.0
+        )
+        offset = self.used + size - VALUE.size
+        self.used += size
+        HEADER.pack_into(self.map, 0, self.used)
+        self.offsets[key] = offset
+        return offset
+
+
+class MemoryValues(dict):
+    def add(self, key, amount):
+        self[key] = self.get(key, 0.0) + amount
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.owner = None
+        self.values = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def storage(self):
+        # После fork у воркера новый pid и должен быть свой файл.
+        owner = (os.getpid(), settings.METRICS_DIR)
+        if self.owner != owner:
+            pid, directory = self.owner = owner
+            self.values = MmapValues(os.path.join(
+                directory, FILE_PATTERN.format(pid)
+            )) if directory else MemoryValues()
+        return self.values
+
+    def add(self, name, labels, amount):
+        key = json.dumps([name, sorted(labels.items())])
+        with self.lock:
+            self.storage().add(key, amount)
+
+    def collect(self):
+        """Значения всех процессов, сложенные по ключам."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            with self.lock:
+                return dict(self.storage())
+        totals = {}
+        for path in glob.glob(os.path.join(directory, FILE_PATTERN.format(
+            '*'
+        ))):
+            with open(path, 'rb') as file:
+                data = file.read()
+            for key, value, _ in read_entries(data):
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus 0.0.4."""
+        samples = {}
+        for key, value in self.collect().items():
+            name, labels = json.loads(key)
+            samples.setdefault(name, []).append((dict(labels), value))
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render(samples))
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('\n', r'\n')
+        .replace('"', r'\"')
+    )
+
+
+def sample(name, labels, value):
+    text = ','.join(
+        f'{label}="{escape(labels[label])}"' for label in sorted(labels)
+    )
+    value = int(value) if float(value).is_integer() else repr(value)
+    return f'{name}{{{text}}} {value}' if text else f'{name} {value}'
+
+
+def bucket_label(bound):
+    return '+Inf' if bound == math.inf else f'{bound:g}'
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, registry):
+        self.name = name
+        self.documentation = documentation
+        self.registry = registry
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, labels, amount)
+
+    def header(self):
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+
+    def render(self, samples):
+        return self.header() + [
+            sample(self.name, labels, value)
+            for labels, value in sorted(
+                samples.get(self.name, []), key=lambda item: sorted(
+                    item[0].items()
+                )
+            )
+        ]
+
+
+class Histogram(Counter):
+    """Гистограмма; корзины хранятся без накопления, накапливаются при
+    выводе, так что наблюдение меняет одно число, а не все корзины."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, registry,
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, registry)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        bound = next(bound for bound in self.buckets if value <= bound)
+        self.registry.add(
+            f'{self.name}_bucket', {**labels, 'le': bucket_label(bound)}, 1
+        )
+        self.registry.add(f'{self.name}_sum', labels, value)
+        self.registry.add(f'{self.name}_count', labels, 1)
+
+    def render(self, samples):
+        lines = self.header()
+        buckets = {}
+        for labels, value in samples.get(f'{self.name}_bucket', []):
+            le = labels.pop('le')
+            buckets.setdefault(tuple(sorted(labels.items())), {})[le] = value
+        sums = {
+            tuple(sorted(labels.items())): value
+            for labels, value in samples.get(f'{self.name}_sum', [])
+        }
+        for key in sorted(buckets):
+            labels, total = dict(key), 0
+            for bound in self.buckets:
+                total += buckets[key].get(bucket_label(bound), 0)
+                lines.append(sample(
+                    f'{self.name}_bucket',
+                    {**labels, 'le': bucket_label(bound)}, total
+                ))
+            lines.append(sample(f'{self.name}_sum', labels, sums.get(key, 0)))
+            lines.append(sample(f'{self.name}_count', labels, total))
+        return lines
+
+
+registry = Registry()
+REQUESTS = Counter(
+    'yatube_http_requests_total',
+    'Число запросов по представлениям, методам и статусам.', registry
+)
+LATENCY = Histogram(
+    'yatube_http_request_duration_seconds',
+    'Время обработки запроса по представлениям.', registry
+)
+DB_QUERIES = Counter(
+    'yatube_db_queries_total',
+    'Запросы к базе данных по представлениям.', registry
+)
+DB_TIME = Counter(
+    'yatube_db_seconds_total',
+    'Время запросов к базе данных по представлениям.', registry
+)
+TEMPLATE_TIME = Counter(
+    'yatube_template_seconds_total',
+    'Время отрисовки шаблонов по представлениям.', registry
+)
+CACHE = Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кэшу страниц и количеств: hit или miss.', registry
+)
+
+
+def observe_request(fields):
+    """Учитывает запрос по замерам ServerTimingMiddleware."""
+    view = fields['view'] or UNRESOLVED
+    REQUESTS.inc(view=view, method=fields['method'], status=fields['status'])
+    LATENCY.observe(fields['total_ms'] / 1000, view=view)
+    DB_QUERIES.inc(fields['db_queries'], view=view)
+    DB_TIME.inc(fields['db_ms'] / 1000, view=view)
+    TEMPLATE_TIME.inc(fields['template_ms'] / 1000, view=view)
+    CACHE.inc(fields['cache_hits'], view=view, result='hit')
+    CACHE.inc(fields['cache_misses'], view=view, result='miss')
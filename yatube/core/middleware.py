@@ -0,0 +1,96 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .metrics import observe_request
+from .routers import (read_from_replica, reading, record_writes,
+                      replica_enabled, written)
+from .timing import RequestTiming, current, server_timing
+
+STICKY_COOKIE = 'primary_db'
+logger = logging.getLogger('core.timing')
+
+
+class ReplicaMiddleware:
+    """Включает чтение с реплики для лент и «прилипание» после записи.
+
+    Если за запрос что-то записано в основную базу, ставится cookie на
+    settings.REPLICA_STICKY_SECONDS секунд, и пока она есть, пользователь
+    читает только основную базу и видит свои изменения.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = written.set(False)
+        primary = connections[DEFAULT_DB_ALIAS]
+        try:
+            with read_from_replica(False), primary.execute_wrapper(
+                record_writes
+            ):
+                response = self.get_response(request)
+            if written.get() and replica_enabled():
+                response.set_cookie(
+                    STICKY_COOKIE, '1',
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True, samesite='Lax'
+                )
+        finally:
+            written.reset(token)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        reading.set(
+            request.method in ('GET', 'HEAD')
+            and STICKY_COOKIE not in request.COOKIES
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+        )
+
+
+class ServerTimingMiddleware:
+    """Отдает замеры запроса в заголовке Server-Timing и в журнал.
+
+    Строка журнала в формате key=value пишется с уровнем INFO, а для
+    запросов дольше settings.SLOW_REQUEST_MS - с уровнем WARNING; те же
+    значения передаются в extra['timing'] для структурных форматтеров
+    и в метрики core.metrics.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        token = current.set(timing)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timing.execute_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        metrics = timing.metrics()
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = server_timing(metrics)
+        match = request.resolver_match
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            **{
+                name: round(value, 1) if isinstance(value, float) else value
+                for name, value in metrics.items()
+            },
+        }
+        logger.log(
+            logging.WARNING if metrics['total_ms'] >= settings.SLOW_REQUEST_MS
+            else logging.INFO,
+            ' '.join(f'{name}={value}' for name, value in fields.items()),
+            extra={'timing': fields}
+        )
+        observe_request(fields)
+        return response
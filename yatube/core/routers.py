@@ -0,0 +1,62 @@
+"""Чтение лент с реплики базы и запись только в основную базу.
+
+Реплика используется, только пока ReplicaMiddleware включил ее для
+запроса: в представлениях из settings.REPLICA_VIEWS и если пользователь
+недавно ничего не записывал. Записью считается выполненный в основной
+базе INSERT, UPDATE или DELETE, а не выбор базы роутером. Сессии и
+пользователи всегда читаются из основной базы.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = 'replica'
+REPLICA_APPS = {'posts'}
+# Область кэша страниц, построенных по реплике; ее сбрасывает sync_replica.
+REPLICA_SCOPE = 'replica'
+
+reading = ContextVar('reading_replica', default=False)
+written = ContextVar('written_primary', default=False)
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+def reading_replica():
+    return reading.get() and replica_enabled()
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    token = reading.set(enabled)
+    try:
+        yield
+    finally:
+        reading.reset(token)
+
+
+def record_writes(execute, sql, params, many, context):
+    """Обертка запросов основной базы, отмечающая запись за запрос."""
+    if sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        written.set(True)
+    return execute(sql, params, many, context)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading_replica() and model._meta.app_label in REPLICA_APPS:
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA
@@ -0,0 +1,29 @@
+import time
+
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template as DjangoTemplate
+
+from .timing import record
+
+
+class Template(DjangoTemplate):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            record('template', time.perf_counter() - started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django, сообщающие время отрисовки в core.timing.
+
+    Вложенные {% include %} и inclusion-теги отрисовываются движком
+    напрямую, поэтому время не считается дважды.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -1,4 +1,30 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.urls import reverse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from posts.models import Post, UserStats
+
+from .cache import get_or_compute, get_versions, page_key
+from .cache_backends import SQLiteCache
+from .db import configure_sqlite
+from .metrics import REQUESTS, registry
+from .middleware import STICKY_COOKIE, ReplicaMiddleware
+from .routers import REPLICA, ReplicaRouter, read_from_replica
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -7,3 +33,334 @@ class ViewTestClass(TestCase):
         self.assertTemplateUsed(
             self.client.get('/nonexist-page/'), 'core/404.html'
         )
+
+
+class SQLitePragmaTests(TestCase):
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234})
+    def test_pragmas_applied(self):
+        """PRAGMA из настроек выполняются для соединения."""
+        configure_sqlite(None, connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 1234)
+
+
+class ServerTimingTests(TestCase):
+    def test_header_and_log(self):
+        """Замеры запроса попадают в Server-Timing и в журнал."""
+        cache.clear()
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            miss = self.client.get(reverse('posts:index'))
+            hit = self.client.get(reverse('posts:index'))
+        self.assertRegex(
+            miss['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="[1-9]\d* queries", tpl;dur=[\d.]+, '
+            r'cache;desc="\d+ hits, [1-9]\d* misses", total;dur=[\d.]+$'
+        )
+        self.assertIn('desc="0 queries"', hit['Server-Timing'])
+        self.assertIn('desc="1 hits, 0 misses"', hit['Server-Timing'])
+        self.assertEqual(
+            [record.levelname for record in logs.records], ['INFO', 'INFO']
+        )
+        self.assertIn(
+            'method=GET path=/ view=posts:index status=200',
+            logs.output[0]
+        )
+        self.assertEqual(logs.records[1].timing['db_queries'], 0)
+
+    @override_settings(SERVER_TIMING=False, SLOW_REQUEST_MS=0)
+    def test_slow_request_without_header(self):
+        """Медленные запросы пишутся с WARNING; заголовок отключается."""
+        with self.assertLogs('core.timing', 'WARNING'):
+            response = self.client.get(reverse('about:tech'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+def count_in_child():
+    REQUESTS.inc(view='posts:index', method='GET', status=200)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        patcher = override_settings(METRICS_DIR=self.directory.name)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def test_histograms_by_view_name(self):
+        """Запросы учитываются по имени маршрута в формате Prometheus."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.get('/nonexist-page/')
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(
+            response['Content-Type'], 'text/plain; version=0.0.4'
+        )
+        text = response.content.decode()
+        for line in (
+            '# TYPE yatube_http_request_duration_seconds histogram',
+            'yatube_http_requests_total{method="GET",status="200",'
+            'view="posts:index"} 2',
+            'yatube_http_requests_total{method="GET",status="404",'
+            'view="<unresolved>"} 1',
+            'yatube_http_request_duration_seconds_bucket{le="+Inf",'
+            'view="posts:index"} 2',
+            'yatube_http_request_duration_seconds_count'
+            '{view="posts:index"} 2',
+            'yatube_cache_requests_total{result="hit",view="posts:index"} 1',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line + '\n', text)
+
+    def test_aggregated_across_processes(self):
+        """Счетчики воркеров складываются через файлы в METRICS_DIR."""
+        for _ in range(2):
+            process = multiprocessing.get_context('fork').Process(
+                target=count_in_child
+            )
+            process.start()
+            process.join()
+        count_in_child()
+        self.assertEqual(len(os.listdir(self.directory.name)), 3)
+        self.assertIn(
+            'yatube_http_requests_total{method="GET",status="200",'
+            'view="posts:index"} 3\n',
+            registry.render()
+        )
+
+    def test_access(self):
+        """Метрики отдаются по токену или разрешенным адресам; по
+        умолчанию адреса, включая локальный, не разрешены."""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.1']):
+            self.assertEqual(
+                self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code,
+                200
+            )
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code, 404
+        )
+        self.assertEqual(self.client.get(
+            url, REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer wrong'
+        ).status_code, 404)
+        self.assertEqual(self.client.get(
+            url, REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer secret'
+        ).status_code, 200)
+
+
+class ReplicaMixin:
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        patcher = mock.patch.dict(settings.DATABASES, {REPLICA: {
+            **settings.DATABASES['default'],
+            'NAME': os.path.join(self.directory.name, 'replica.sqlite3'),
+        }})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(connections.__delitem__, REPLICA)
+        self.addCleanup(connections[REPLICA].close)
+
+    def handle(self, view_name, method='get', cookies=None, write=False):
+        """Проводит запрос через ReplicaMiddleware и возвращает базы,
+        выбранные роутером для постов и пользователей, и ответ."""
+        router = ReplicaRouter()
+        used = {}
+
+        def view(request):
+            used['posts'] = router.db_for_read(Post)
+            used['users'] = router.db_for_read(User)
+            used['key'] = page_key(request, ['posts'])
+            router.db_for_write(Post)
+            if write:
+                Post.objects.filter(pk=0).update(text='')
+            return HttpResponse()
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaMiddleware(get_response)
+        request = getattr(RequestFactory(), method)('/')
+        request.user = mock.Mock(pk=None)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = mock.Mock(view_name=view_name)
+        return used, middleware(request)
+
+
+class ReplicaTests(ReplicaMixin, SimpleTestCase):
+    def test_feeds_read_from_replica(self):
+        """Ленты читают посты с реплики, остальное - с основной базы."""
+        used, response = self.handle('posts:index')
+        self.assertEqual(used['posts'], REPLICA)
+        self.assertEqual(used['users'], 'default')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        for view_name, method in (('posts:post_detail', 'get'),
+                                  ('posts:index', 'post')):
+            with self.subTest(view_name=view_name, method=method):
+                used, _ = self.handle(view_name, method)
+                self.assertEqual(used['posts'], 'default')
+        self.assertEqual(ReplicaRouter().db_for_read(Post), 'default')
+
+
+class ReplicaWriteTests(ReplicaMixin, TestCase):
+    def test_reads_stick_to_primary_after_write(self):
+        """После записи пользователь читает основную базу, а выбор базы
+        для записи без самой записи на чтение не влияет."""
+        _, response = self.handle('posts:post_create', 'post')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        _, response = self.handle('posts:post_create', 'post', write=True)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        used, _ = self.handle(
+            'posts:index', cookies={STICKY_COOKIE: '1'}
+        )
+        self.assertEqual(used['posts'], 'default')
+        self.assertEqual(
+            ReplicaRouter().db_for_write(Post, instance=Post()), 'default'
+        )
+
+
+class SyncReplicaTests(ReplicaMixin, TransactionTestCase):
+    # Онлайн-бэкап ждет конца открытой транзакции, поэтому без TestCase.
+    def test_sync_replica(self):
+        """sync_replica копирует базу и сбрасывает страницы с реплики."""
+        author = User.objects.create(username='auth')
+        Post.objects.create(text='Пост для реплики', author=author)
+        before, _ = self.handle('posts:index')
+        call_command('sync_replica', stdout=mock.Mock())
+        after, _ = self.handle('posts:index')
+        self.assertNotEqual(before['key'], after['key'])
+        with sqlite3.connect(settings.DATABASES[REPLICA]['NAME']) as replica:
+            self.assertEqual(
+                replica.execute('SELECT text FROM posts_post').fetchall(),
+                [('Пост для реплики',)]
+            )
+
+    def test_stats_of_user_missing_on_replica(self):
+        """Счетчики пользователя, которого еще нет на реплике,
+        пересчитываются и читаются из основной базы."""
+        call_command('sync_replica', stdout=mock.Mock())
+        user = User.objects.create(username='new')
+        with read_from_replica():
+            stats = UserStats.objects.for_user(user)
+        self.assertEqual((stats.user_id, stats.posts), (user.pk, 0))
+
+
+def set_in_child(location):
+    SQLiteCache(location, {}).set('shared', 'из другого процесса')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self.directory.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_cache(self, **options):
+        options.setdefault('ACCESS_RESOLUTION', 0)
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_and_timeouts(self):
+        """Значения хранятся до истечения срока жизни."""
+        cache = self.make_cache()
+        cache.set('forever', [1, 2], None)
+        cache.set('short', 1, 0.2)
+        cache.set('counter', 1)
+        self.assertEqual(cache.get('forever'), [1, 2])
+        self.assertEqual(cache.incr('counter', 2), 3)
+        self.assertFalse(cache.add('counter', 10))
+        self.assertEqual(cache.get_many(['counter', 'nope']), {'counter': 3})
+        time.sleep(0.3)
+        self.assertIsNone(cache.get('short'))
+        self.assertTrue(cache.add('short', 2))
+        with self.assertRaises(ValueError):
+            cache.incr('nope')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся записи."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(
+            cache.get_many(['a', 'b', 'c', 'd']),
+            {'a': 'a', 'c': 'c', 'd': 'd'}
+        )
+
+    def test_size_limit(self):
+        """Суммарный объем значений не превышает MAX_SIZE."""
+        cache = self.make_cache(MAX_SIZE=1000)
+        for number in range(20):
+            cache.set(number, b'x' * 100)
+        entries, size = cache._connection.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        self.assertLessEqual(size, 1000)
+        self.assertEqual(len(cache.get_many(range(20))), entries)
+        self.assertIsNotNone(cache.get(19))
+
+    def test_shared_between_processes(self):
+        """Запись из одного процесса видна в другом."""
+        process = multiprocessing.get_context('fork').Process(
+            target=set_in_child, args=(self.location,)
+        )
+        process.start()
+        process.join()
+        self.assertEqual(
+            self.make_cache().get('shared'), 'из другого процесса'
+        )
+
+
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        time.sleep(0.2)
+        return self.calls
+
+    def test_single_flight(self):
+        """Одновременные промахи перестраивают значение один раз."""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                get_or_compute('key', self.compute, 60)
+            ))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [1] * 8)
+
+    @override_settings(CACHE_VERSION_TIMEOUT=0.1)
+    def test_versions_expire_without_shared_cache(self):
+        """Без общего кэша версии областей устаревают сами, и изменения
+        из других воркеров становятся видны через CACHE_VERSION_TIMEOUT."""
+        first = get_versions('posts')
+        self.assertEqual(get_versions('posts'), first)
+        time.sleep(0.2)
+        self.assertNotEqual(get_versions('posts'), first)
+
+    def test_early_expiration(self):
+        """Запись перестраивается заранее, пока остальные видят старую."""
+        get_or_compute('key', self.compute, 60)
+        with mock.patch('core.cache.expires_early', return_value=False):
+            self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        with mock.patch('core.cache.expires_early', return_value=True):
+            self.assertEqual(get_or_compute('key', self.compute, 60), 2)
+            cache.add('lock:key', True)
+            self.assertEqual(get_or_compute('key', self.compute, 60), 2)
+        self.assertEqual(self.calls, 2)
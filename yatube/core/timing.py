@@ -0,0 +1,59 @@
+"""Замеры одного запроса: время и число запросов к базе, время шаблонов,
+попадания и промахи кэша.
+
+ServerTimingMiddleware кладет RequestTiming в contextvar на время
+запроса, остальной код сообщает о событиях через record(); вне запроса
+record() ничего не делает.
+"""
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = Counter()  # секунды
+        self.counts = Counter()
+
+    def add(self, name, seconds=0.0, count=1):
+        self.durations[name] += seconds
+        self.counts[name] += count
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - started)
+
+    def metrics(self):
+        """Итоги запроса в миллисекундах."""
+        return {
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'db_ms': self.durations['db'] * 1000.0,
+            'db_queries': self.counts['db'],
+            'template_ms': self.durations['template'] * 1000.0,
+            'cache_hits': self.counts['cache_hit'],
+            'cache_misses': self.counts['cache_miss'],
+        }
+
+
+def record(name, seconds=0.0, count=1):
+    timing = current.get()
+    if timing is not None:
+        timing.add(name, seconds, count)
+
+
+def server_timing(metrics):
+    """Значение заголовка Server-Timing."""
+    return ', '.join((
+        f'db;dur={metrics["db_ms"]:.1f};'
+        f'desc="{metrics["db_queries"]} queries"',
+        f'tpl;dur={metrics["template_ms"]:.1f}',
+        f'cache;desc="{metrics["cache_hits"]} hits, '
+        f'{metrics["cache_misses"]} misses"',
+        f'total;dur={metrics["total_ms"]:.1f}',
+    ))
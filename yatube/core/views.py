@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from .metrics import registry
 
 
 def page_not_found(request, exception):
@@ -17,3 +22,18 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    allowed = (
+        request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+        or token and constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {token}'
+        )
+    )
+    if not allowed:
+        raise Http404
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
@@ -1,9 +1,90 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
 
-from .models import Comment, Follow, Group, Post
+from . import bulk, search
+from .models import Comment, Follow, Group, Post, SearchEntry
+from .paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """Фильтр по связанному объекту с поиском вместо списка всех объектов.
+
+    Из базы загружается только выбранный объект, остальные ищутся через
+    автодополнение админки (нужны search_fields у админки связанной модели).
+    """
+    template = 'admin/posts/autocomplete_filter.html'
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+        try:
+            value = field.target_field.to_python(self.lookup_val)
+        except ValidationError:
+            # Список сам отвечает на негодный параметр переходом на ?e=1.
+            return []
+        return field.get_choices(
+            include_blank=False,
+            limit_choices_to={field.target_field.name: value}
+        )
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        form_field = self.field.formfield(
+            widget=AutocompleteSelect(
+                self.field, changelist.model_admin.admin_site
+            ),
+            required=False
+        )
+        self.widget = form_field.widget.render(
+            self.lookup_kwarg, self.lookup_val
+        )
+        self.hidden_params = [
+            (name, value) for name, value in changelist.params.items()
+            if name not in (*self.expected_parameters(), 'p')
+        ]
+        return super().choices(changelist)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Список, который не замедляется с ростом таблицы."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    @property
+    def media(self):
+        # Скрипты select2 нужны фильтрам AutocompleteFilter.
+        return super().media + AutocompleteSelect(None, self.admin_site).media
+
+
+class SearchIndexAdmin(ScalableAdmin):
+    """Поиск по индексу FTS5 вместо LIKE по всей таблице."""
+    search_index_field = 'post'
+
+    def get_search_results(self, request, queryset, search_term):
+        match = search.fts_query(search_term)
+        if not match or not search.is_supported():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(pk__in=SearchEntry.objects.filter(
+            text__match=match,
+            comment__isnull=self.search_index_field == 'post'
+        ).values(self.search_index_field)), False
+
+
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа'
+    )
+
+
+class PostAdmin(SearchIndexAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,13 +92,42 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    list_filter = (
+        'pub_date',
+        ('author', AutocompleteFilter),
+        ('group', AutocompleteFilter),
+    )
+    autocomplete_fields = ('author', 'group')
+    action_form = PostActionForm
+    actions = ('move_to_group', 'detach_group')
 
+    @admin.action(
+        description='Перенести выбранные посты в группу',
+        permissions=('change',)
+    )
+    def move_to_group(self, request, queryset):
+        group = Group.objects.filter(pk=request.POST.get('group')).first()
+        if group is None:
+            self.message_user(
+                request, 'Выберите группу для переноса.', messages.WARNING
+            )
+            return
+        moved = bulk.move_posts(queryset, group)
+        self.message_user(request, f'Перенесено в «{group}»: {moved}.')
+
+    @admin.action(
+        description='Убрать выбранные посты из групп',
+        permissions=('change',)
+    )
+    def detach_group(self, request, queryset):
+        self.message_user(
+            request, f'Убрано из групп: {bulk.move_posts(queryset, None)}.'
+        )
 
-class CommentAdmin(admin.ModelAdmin):
+
+class CommentAdmin(SearchIndexAdmin):
     list_display = (
         'pk',
         'text',
@@ -25,23 +135,55 @@ class CommentAdmin(admin.ModelAdmin):
         'author',
         'post',
     )
-    search_fields = ('text', 'author')
-    list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('author', 'post__author', 'post__group')
+    search_fields = ('text',)
+    search_index_field = 'comment'
+    list_filter = (
+        'pub_date',
+        ('author', AutocompleteFilter),
+        ('post', AutocompleteFilter),
+    )
+    autocomplete_fields = ('author', 'post')
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = (
         'user',
         'author',
     )
-    list_editable = ('author',)
-    search_fields = ('user', 'author')
-    list_filter = ('user', 'author')
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    list_filter = (
+        ('user', AutocompleteFilter),
+        ('author', AutocompleteFilter),
+    )
+    autocomplete_fields = ('user', 'author')
+    actions = ('remove_follows',)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(
+        description='Удалить выбранные подписки', permissions=('delete',)
+    )
+    def remove_follows(self, request, queryset):
+        self.message_user(
+            request, f'Удалено подписок: {bulk.delete_follows(queryset)}.'
+        )
+
+
+class GroupAdmin(ScalableAdmin):
+    list_display = (
+        'pk',
+        'title',
+        'slug',
+    )
+    search_fields = ('title', '=slug')
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,109 @@
+"""Массовые изменения постов и подписок без сигналов на каждую строку.
+
+Строки обрабатываются пачками по BULK_BATCH_SIZE первичных ключей: на
+пачку приходится несколько запросов UPDATE/DELETE, а кэш страниц,
+количества, ленты и счетчики пользователей сбрасываются разом для всей
+пачки, а не для каждой строки.
+"""
+from core.cache import bump
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from .constants import BULK_BATCH_SIZE
+from .counts import invalidate_counts
+from .models import Follow, Post, Timeline, User, UserStats
+from .signals import group_scopes, profile_scopes
+
+FILL_TIMELINES_SQL = '''
+    INSERT INTO {timeline} (user_id, post_id, pub_date)
+    SELECT follow.user_id, post.id, post.pub_date
+    FROM {follow} AS follow
+    INNER JOIN {post} AS post ON post.author_id = follow.author_id
+    WHERE follow.user_id IN ({users})
+    ON CONFLICT DO NOTHING
+'''
+
+
+def batches(queryset, size=BULK_BATCH_SIZE):
+    """Первичные ключи строк запроса пачками, по возрастанию ключа.
+
+    Каждая следующая пачка выбирается заново после последнего ключа, так
+    что изменение строк предыдущей пачки не сбивает перебор.
+    """
+    last = None
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    while True:
+        batch = list(
+            (queryset if last is None else queryset.filter(pk__gt=last))
+            [:size]
+        )
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+def move_posts(queryset, group):
+    """Переносит посты в группу group (None - убирает из групп)."""
+    moved = 0
+    for batch in batches(queryset):
+        posts = Post.objects.filter(pk__in=batch)
+        authors, groups = set(), {getattr(group, 'pk', None)}
+        for author_id, group_id in posts.values_list(
+            'author_id', 'group_id'
+        ).distinct():
+            authors.add(author_id)
+            groups.add(group_id)
+        with transaction.atomic():
+            moved += posts.update(group=group)
+        bump(*profile_scopes(*authors), *group_scopes(*groups))
+    if moved:
+        invalidate_counts()
+        bump('posts')
+    return moved
+
+
+def delete_follows(queryset):
+    """Удаляет подписки вместе с записями лент, пересчитывая счетчики."""
+    deleted = 0
+    for batch in batches(queryset):
+        follows = Follow.objects.filter(pk__in=batch)
+        users = set()
+        for user_id, author_id in follows.values_list('user_id', 'author_id'):
+            users.update((user_id, author_id))
+        with transaction.atomic():
+            Timeline.objects.filter(Exists(follows.filter(
+                user_id=OuterRef('user_id'),
+                author_id=OuterRef('post__author_id')
+            ))).delete()
+            # Намеренно без post_delete: их обработчики работают по одной
+            # подписке (trim_timeline, count_unfollow, reset_counts,
+            # reset_follow_profiles). Их работу пачкой повторяют удаление
+            # из Timeline выше, пересчет UserStats, invalidate_counts и
+            # bump страниц профилей ниже - новый обработчик подписок
+            # нужно повторить и здесь.
+            deleted += follows._raw_delete(follows.db)
+            UserStats.objects.rebuild(User.objects.filter(pk__in=users))
+        bump(*profile_scopes(*users))
+    if deleted:
+        invalidate_counts()
+    return deleted
+
+
+def fill_timelines(users):
+    """Заполняет ленты пользователей постами всех, на кого они подписаны.
+
+    Для загрузки данных без сигналов: на пачку читателей приходится один
+    INSERT ... SELECT, а не строка за строкой. Возвращает число записей.
+    """
+    filled = 0
+    for batch in batches(users):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(FILL_TIMELINES_SQL.format(
+                timeline=Timeline._meta.db_table,
+                follow=Follow._meta.db_table,
+                post=Post._meta.db_table,
+                users=', '.join(['%s'] * len(batch)),
+            ), batch)
+            filled += cursor.rowcount
+    return filled
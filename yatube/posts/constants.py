@@ -1,3 +1,45 @@
 """Этот модуль определяет константы уровня проекта Posts."""
 
 POSTS_NUMBER = 10
+TIMELINE_BATCH_SIZE = 500
+COUNT_CACHE_TIMEOUT = 60 * 60
+COUNT_ESTIMATE_THRESHOLD = 100_000
+PAGE_RANGE_ON_EACH_SIDE = 2
+PAGE_RANGE_ON_ENDS = 1
+STATS_BATCH_SIZE = 1000
+COMMENTS_NUMBER = 20
+THUMBNAIL_RATIO = (960, 339)
+THUMBNAIL_WIDTHS = (480, 720, 960, 1440)
+THUMBNAIL_FORMATS = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+THUMBNAIL_FALLBACK_FORMAT = 'JPEG'
+THUMBNAIL_VARIANTS = {
+    (width, image_format): (
+        '{}x{}'.format(
+            width, round(width * THUMBNAIL_RATIO[1] / THUMBNAIL_RATIO[0])
+        ),
+        {'crop': 'center', 'upscale': True, 'format': image_format},
+    )
+    for image_format in THUMBNAIL_FORMATS
+    for width in THUMBNAIL_WIDTHS
+}
+THUMBNAIL_FAILURE_TIMEOUT = 60 * 60
+THUMBNAIL_SIZES = {
+    'listing': (
+        '(min-width: 1400px) 1296px, (min-width: 1200px) 1116px, '
+        '(min-width: 992px) 936px, (min-width: 768px) 696px, '
+        '(min-width: 576px) 516px, 100vw'
+    ),
+    'detail': (
+        '(min-width: 1400px) 972px, (min-width: 1200px) 837px, '
+        '(min-width: 992px) 702px, (min-width: 768px) 522px, '
+        '(min-width: 576px) 516px, 100vw'
+    ),
+}
+IMAGE_MAX_SIZE = 2048
+IMAGE_MAX_PIXELS = 50_000_000
+IMAGE_QUALITY = 85
+SEARCH_MAX_TERMS = 16
+SEARCH_SNIPPET_TOKENS = 24
+SEARCH_PREFIX_MIN_LENGTH = 3
+SEARCH_CANDIDATES = 1000
+BULK_BATCH_SIZE = 500
@@ -0,0 +1,63 @@
+"""Кэшируемый и приблизительный подсчет объектов в лентах."""
+import hashlib
+
+from core.cache import bump, get_versions
+from core.timing import record
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+from .constants import COUNT_CACHE_TIMEOUT, COUNT_ESTIMATE_THRESHOLD
+
+COUNTS_SCOPE = 'counts'
+
+
+def invalidate_counts():
+    """Делает устаревшими все закэшированные количества."""
+    bump(COUNTS_SCOPE)
+
+
+def estimated_count(queryset):
+    """Оценка размера таблицы без полного прохода по ней.
+
+    Возвращает None, если у запроса есть фильтры или СУБД не умеет
+    давать оценку.
+    """
+    if queryset.query.where or queryset.query.distinct:
+        return None
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    if connection.vendor == 'sqlite':
+        sql, params = f'SELECT MAX(rowid) FROM {table}', ()
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+        params = (queryset.model._meta.db_table,)
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return row[0] if row and row[0] and row[0] > 0 else None
+
+
+def cached_count(queryset, estimate=False):
+    """Количество объектов, закэшированное по тексту SQL-запроса.
+
+    В режиме estimate для больших таблиц вместо COUNT(*) берется оценка.
+    """
+    try:
+        signature = str(queryset.query)
+    except EmptyResultSet:
+        return 0
+    key = 'counts:{}:{}'.format(
+        *get_versions(COUNTS_SCOPE),
+        hashlib.md5(signature.encode()).hexdigest()
+    )
+    count = cache.get(key)
+    record('cache_hit' if count is not None else 'cache_miss')
+    if count is None:
+        count = estimated_count(queryset) if estimate else None
+        if count is None or count < COUNT_ESTIMATE_THRESHOLD:
+            count = queryset.count()
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
@@ -0,0 +1,87 @@
+"""Нормализация картинок постов при загрузке.
+
+Картинка проверяется по заголовку до декодирования, поворачивается по
+EXIF, уменьшается до IMAGE_MAX_SIZE по большей стороне и сохраняется
+заново без метаданных в том же формате и под тем же именем. Форматы,
+которые Pillow умеет только читать, сохраняются в FALLBACK_FORMAT.
+"""
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from PIL import Image, ImageOps
+
+from .constants import IMAGE_MAX_PIXELS, IMAGE_MAX_SIZE, IMAGE_QUALITY
+
+TOO_LARGE = ('Картинка слишком большая: {width}x{height}, '
+             'допускается не больше {limit} мегапикселей.')
+INVALID = 'Не удалось прочитать картинку.'
+RGB_FORMATS = ('JPEG',)
+FALLBACK_FORMAT = ('PNG', '.png', 'image/png')
+PNG_MODES = ('1', 'L', 'LA', 'I', 'P', 'RGB', 'RGBA')
+
+
+def open_checked(file):
+    """Открывает картинку, прочитав только заголовок.
+
+    Размеры из заголовка сверяются с IMAGE_MAX_PIXELS до того, как
+    распаковываются пиксели, поэтому «бомба» не успевает занять память.
+    """
+    file.seek(0)
+    try:
+        image = Image.open(file)
+    except (Image.DecompressionBombError, OSError, SyntaxError):
+        raise ValidationError(INVALID, code='invalid_image')
+    width, height = image.size
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            TOO_LARGE.format(
+                width=width, height=height,
+                limit=IMAGE_MAX_PIXELS // 1_000_000
+            ),
+            code='image_too_large'
+        )
+    return image
+
+
+def normalize(upload):
+    """Загруженная картинка в нормальном виде.
+
+    Анимированные картинки не перекодируются, для них только проверяется
+    размер. Результат держится в памяти, только пока он не больше
+    FILE_UPLOAD_MAX_MEMORY_SIZE, дальше пишется во временный файл.
+    """
+    image = open_checked(upload)
+    if getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload
+    image_format = image.format
+    name, content_type = upload.name, upload.content_type
+    fallback = image_format not in Image.SAVE
+    if fallback:
+        image_format, extension, content_type = FALLBACK_FORMAT
+        name = os.path.splitext(name)[0] + extension
+    image.draft('RGB', (IMAGE_MAX_SIZE, IMAGE_MAX_SIZE))
+    try:
+        image = ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError):
+        raise ValidationError(INVALID, code='invalid_image')
+    image.thumbnail((IMAGE_MAX_SIZE, IMAGE_MAX_SIZE))
+    if image_format in RGB_FORMATS and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif fallback and image.mode not in PNG_MODES:
+        image = image.convert('RGBA')
+    file = SpooledTemporaryFile(settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    try:
+        image.save(
+            file, format=image_format, quality=IMAGE_QUALITY, optimize=True
+        )
+    except (KeyError, OSError, ValueError):
+        raise ValidationError(INVALID, code='invalid_image')
+    size = file.tell()
+    file.seek(0)
+    return InMemoryUploadedFile(
+        file, upload.field_name, name, content_type, size, upload.charset
+    )
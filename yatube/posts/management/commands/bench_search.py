@@ -0,0 +1,185 @@
+import itertools
+import json
+import os
+import random
+import sqlite3
+import statistics
+import string
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.constants import SEARCH_CANDIDATES
+
+SCHEMA = '''
+CREATE TABLE posts_post (id INTEGER PRIMARY KEY, text TEXT NOT NULL);
+CREATE TABLE posts_comment (
+    id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, text TEXT NOT NULL
+);
+'''
+QUERIES = {
+    'like_page': '''
+        SELECT id FROM posts_post WHERE text LIKE ?
+        ORDER BY id DESC LIMIT 11
+    ''',
+    'like_count': 'SELECT count(*) FROM posts_post WHERE text LIKE ?',
+    'fts_page': f'''
+        SELECT post_id, MIN(rank) AS search_rank FROM posts_search
+        WHERE posts_search.text MATCH :match AND rowid >= COALESCE((
+            SELECT rowid FROM posts_search WHERE posts_search.text MATCH :match
+            ORDER BY rowid DESC LIMIT 1 OFFSET {SEARCH_CANDIDATES - 1}
+        ), 0)
+        GROUP BY post_id ORDER BY search_rank, post_id LIMIT 11
+    ''',
+    'fts_count': '''
+        SELECT count(DISTINCT post_id) FROM posts_search
+        WHERE posts_search MATCH ?
+    ''',
+}
+RANKS = (1, 10, 100, 1000, 10000)
+
+
+def words(chooser, count):
+    return [
+        ''.join(chooser.choices(string.ascii_lowercase, k=chooser.randint(
+            4, 10
+        )))
+        for _ in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск LIKE и FTS5 на синтетических данных '
+            'во временной базе SQLite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=float, default=0.5,
+                            help='Комментариев на пост в среднем.')
+        parser.add_argument('--words', type=int, default=30,
+                            help='Слов в тексте.')
+        parser.add_argument('--vocabulary', type=int, default=50_000)
+        parser.add_argument('--batch', type=int, default=10_000)
+        parser.add_argument('--insert-sample', type=int, default=10_000,
+                            help='Постов для замера вставки с триггерами.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', help='Файл для результатов.')
+
+    def handle(self, *args, **options):
+        chooser = self.chooser = random.Random(options['seed'])
+        vocabulary = words(chooser, options['vocabulary'])
+        weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)
+        ))
+
+        def texts(count):
+            chosen = chooser.choices(
+                vocabulary, cum_weights=weights, k=count * options['words']
+            )
+            return [
+                ' '.join(chosen[start:start + options['words']])
+                for start in range(0, len(chosen), options['words'])
+            ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench_search.sqlite3')
+            connection = sqlite3.connect(path, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            results = self.fill(connection, texts, options)
+            results['database_mb'] = os.path.getsize(path) / 2 ** 20
+            results['queries'] = self.query(connection, vocabulary, options)
+            connection.close()
+        self.report(results)
+        if options['json']:
+            with open(options['json'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def insert(self, connection, texts, first_id, count, options):
+        started = time.perf_counter()
+        for start in range(first_id, first_id + count, options['batch']):
+            size = min(options['batch'], first_id + count - start)
+            connection.execute('BEGIN')
+            connection.executemany(
+                'INSERT INTO posts_post VALUES (?, ?)',
+                zip(range(start, start + size), texts(size))
+            )
+            comments = int(size * options['comments'])
+            connection.executemany(
+                'INSERT INTO posts_comment (post_id, text) VALUES (?, ?)',
+                zip(
+                    (self.chooser.randrange(start, start + size)
+                     for _ in range(comments)),
+                    texts(comments)
+                )
+            )
+            connection.execute('COMMIT')
+        return time.perf_counter() - started
+
+    def fill(self, connection, texts, options):
+        posts, sample = options['posts'], options['insert_sample']
+        results = {'posts': posts, 'comments_per_post': options['comments']}
+        plain = self.insert(connection, texts, 1, posts, options)
+        results['insert_plain_per_s'] = posts / plain
+        started = time.perf_counter()
+        connection.execute('BEGIN')
+        for statement in search.CREATE_SQL + search.REBUILD_SQL:
+            connection.execute(statement)
+        connection.execute('COMMIT')
+        results['index_build_s'] = time.perf_counter() - started
+        indexed = self.insert(connection, texts, posts + 1, sample, options)
+        results['insert_with_triggers_per_s'] = sample / indexed
+        return results
+
+    def query(self, connection, vocabulary, options):
+        results = {}
+        for rank in RANKS:
+            if rank > len(vocabulary):
+                break
+            word = vocabulary[rank - 1]
+            params = {
+                'like_page': f'%{word}%',
+                'like_count': f'%{word}%',
+                'fts_page': search.fts_query(word),
+                'fts_count': search.fts_query(word),
+            }
+            result = {'word': word}
+            for name, sql in QUERIES.items():
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    rows = connection.execute(
+                        sql, {'match': params[name]} if ':match' in sql
+                        else [params[name]]
+                    ).fetchall()
+                    timings.append(time.perf_counter() - started)
+                result[f'{name}_ms'] = statistics.median(timings) * 1000
+                if name.endswith('count'):
+                    result[name.replace('_count', '_matches')] = rows[0][0]
+            results[rank] = result
+        return results
+
+    def report(self, results):
+        self.stdout.write(
+            f'posts: {results["posts"]}, index build: '
+            f'{results["index_build_s"]:.1f} s, database: '
+            f'{results["database_mb"]:.0f} MB\n'
+            f'inserts/s: {results["insert_plain_per_s"]:.0f} without '
+            f'index, {results["insert_with_triggers_per_s"]:.0f} with '
+            'triggers'
+        )
+        self.stdout.write(
+            f'{"rank":>6} {"matches":>9} {"like page":>10} '
+            f'{"like count":>11} {"fts page":>9} {"fts count":>10}  (ms)'
+        )
+        for rank, result in results['queries'].items():
+            self.stdout.write(
+                f'{rank:>6} {result["fts_matches"]:>9} '
+                f'{result["like_page_ms"]:>10.1f} '
+                f'{result["like_count_ms"]:>11.1f} '
+                f'{result["fts_page_ms"]:>9.1f} '
+                f'{result["fts_count_ms"]:>10.1f}'
+            )
@@ -0,0 +1,341 @@
+import bisect
+import itertools
+import math
+import multiprocessing
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from core.cache import bump
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from posts import search
+from posts.bulk import fill_timelines
+from posts.counts import invalidate_counts
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+# Доля постов по часам суток (пик вечером, минимум ночью).
+HOURLY_ACTIVITY = (
+    1.0, 0.6, 0.4, 0.3, 0.3, 0.4, 0.8, 1.5, 2.0, 2.2, 2.2, 2.3,
+    2.5, 2.4, 2.3, 2.3, 2.4, 2.6, 2.9, 3.2, 3.3, 3.0, 2.4, 1.6,
+)
+HOURS = list(itertools.accumulate(HOURLY_ACTIVITY))
+COMMENT_DELAY = 6 * 60 * 60
+MAX_FOLLOWS = 5000
+UNGROUPED = 0.3
+SENTENCES = 5000
+WRITE_ATTEMPTS = 8
+WRITE_BACKOFF = 0.1
+NAMES = 1000
+# Состояние генерации; процессы-воркеры получают его при fork.
+state = {}
+
+
+def zipf_weights(count, exponent, chooser=None):
+    """Накопленные веса степенного закона; с chooser ранги перемешаны."""
+    ranks = list(range(1, count + 1))
+    if chooser is not None:
+        chooser.shuffle(ranks)
+    return list(itertools.accumulate(rank ** -exponent for rank in ranks))
+
+
+def spread(index, total):
+    """Дата index-й из total записей: активность растет со временем,
+    время суток следует HOURLY_ACTIVITY."""
+    day = int(state['days'] * math.sqrt((index + 0.5) / total))
+    mixed = index * 2654435761 % 2 ** 32
+    hour = bisect.bisect(HOURS, mixed / 2 ** 32 * HOURS[-1])
+    return min(
+        state['start'] + timedelta(
+            days=day, hours=hour, seconds=mixed % 3600
+        ),
+        state['now']
+    )
+
+
+@contextmanager
+def explicit_dates(*models):
+    """Позволяет bulk_create записать заданные pub_date (auto_now_add)."""
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def make_users(chooser, texts, start, stop):
+    return [
+        User(
+            id=state['users'][0] + number,
+            username=f'user_{state["users"][0] + number}',
+            first_name=chooser.choice(texts['first_names']),
+            last_name=chooser.choice(texts['last_names']),
+            password=state['password'],
+            date_joined=spread(number, state['users'][1]),
+        )
+        for number in range(start, stop)
+    ]
+
+
+def pick(chooser, first, weights, count):
+    """count случайных id с накопленными весами weights."""
+    return [
+        first + index
+        for index in chooser.choices(
+            range(len(weights)), cum_weights=weights, k=count
+        )
+    ]
+
+
+def make_posts(chooser, texts, start, stop):
+    count = stop - start
+    first_group, groups = state['groups']
+    authors = pick(chooser, state['users'][0], state['activity'], count)
+    group_ids = (
+        pick(chooser, first_group, state['group_weights'], count) if groups
+        else [None] * count
+    )
+    sentences = texts['sentences']
+    return [
+        Post(
+            id=state['posts'][0] + number,
+            text=' '.join(chooser.choices(sentences, k=length)),
+            author_id=author,
+            group_id=None if chooser.random() < UNGROUPED else group,
+            pub_date=spread(number, state['posts'][1]),
+        )
+        for number, author, group, length in zip(
+            range(start, stop), authors, group_ids,
+            chooser.choices(range(1, 5), k=count)
+        )
+    ]
+
+
+def make_comments(chooser, texts, start, stop):
+    count = stop - start
+    first_post, posts = state['posts']
+    authors = pick(chooser, state['users'][0], state['activity'], count)
+    return [
+        Comment(
+            id=state['comments'][0] + number,
+            text=text,
+            author_id=author,
+            post_id=first_post + post,
+            pub_date=min(
+                spread(post, posts) + timedelta(
+                    seconds=chooser.expovariate(1 / COMMENT_DELAY)
+                ),
+                state['now']
+            ),
+        )
+        for number, author, post, text in zip(
+            range(start, stop), authors,
+            [chooser.randrange(posts) for _ in range(count)],
+            chooser.choices(texts['sentences'], k=count)
+        )
+    ]
+
+
+def make_follows(chooser, texts, start, stop):
+    """Подписки читателей start..stop: их число и популярность авторов
+    распределены по степенному закону."""
+    first_user, users = state['users']
+    follows = []
+    for reader in range(start, stop):
+        wanted = min(
+            max(1, round(
+                chooser.paretovariate(2) * state['follows'] / 2
+            )),
+            users - 1, MAX_FOLLOWS
+        )
+        authors = set()
+        while len(authors) < wanted:
+            authors.update(
+                author for author in chooser.choices(
+                    range(users), cum_weights=state['popularity'],
+                    k=wanted - len(authors)
+                ) if author != reader
+            )
+        follows.extend(
+            Follow(user_id=first_user + reader, author_id=first_user + author)
+            for author in authors
+        )
+    return follows
+
+
+MAKERS = {
+    'users': (User, make_users),
+    'posts': (Post, make_posts),
+    'comments': (Comment, make_comments),
+    'follows': (Follow, make_follows),
+}
+
+
+def load_texts(seed):
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    return {
+        'sentences': [fake.sentence() for _ in range(SENTENCES)],
+        'first_names': [fake.first_name() for _ in range(NAMES)],
+        'last_names': [fake.last_name() for _ in range(NAMES)],
+    }
+
+
+def write(model, rows):
+    """Записывает строки одной короткой транзакцией.
+
+    Воркеры пишут по очереди: если блокировка записи не досталась за
+    busy_timeout, попытка повторяется с нарастающей паузой.
+    """
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(rows)
+            return
+        except OperationalError as error:
+            if ('locked' not in str(error)
+                    or attempt == WRITE_ATTEMPTS - 1):
+                raise
+            time.sleep(random.uniform(0, 2 ** attempt * WRITE_BACKOFF))
+
+
+def generate(task):
+    """Строит и записывает одну порцию строк; возвращает их число."""
+    kind, start, stop = task
+    if 'texts' not in state:
+        state['texts'] = load_texts(state['seed'])
+    chooser = random.Random(f'{state["seed"]}:{kind}:{start}')
+    model, make = MAKERS[kind]
+    rows = make(chooser, state['texts'], start, stop)
+    with explicit_dates(Post, Comment):
+        for first in range(0, len(rows), state['batch']):
+            write(model, rows[first:first + state['batch']])
+    return len(rows)
+
+
+class Command(BaseCommand):
+    help = ('Генерирует большой синтетический набор данных: пользователей, '
+            'группы, посты, комментарии и подписки со степенным '
+            'распределением и реалистичными датами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200_000)
+        parser.add_argument('--groups', type=int, default=500)
+        parser.add_argument('--posts', type=int, default=4_000_000)
+        parser.add_argument('--comments', type=int, default=4_000_000)
+        parser.add_argument('--follows', type=float, default=10,
+                            help='Подписок на пользователя в среднем.')
+        parser.add_argument('--exponent', type=float, default=1.0,
+                            help='Показатель степенного закона.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней до сегодня начинаются '
+                                 'посты.')
+        parser.add_argument('--password', default='password',
+                            help='Пароль всех созданных пользователей.')
+        parser.add_argument('--workers', type=int,
+                            default=multiprocessing.cpu_count(),
+                            help='Процессов (0 - в текущем процессе).')
+        parser.add_argument('--chunk', type=int, default=50_000,
+                            help='Строк в порции одного процесса.')
+        parser.add_argument('--batch', type=int, default=5000,
+                            help='Строк в одной транзакции.')
+        parser.add_argument('--no-timelines', action='store_true',
+                            help='Не заполнять ленты подписок.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.prepare(options)
+        with search.deferred_index():
+            for kinds in (('users',), ('posts',), ('comments', 'follows')):
+                self.run(kinds, options)
+            users = User.objects.filter(id__gte=state['users'][0])
+            if not options['no_timelines']:
+                self.step('timelines', lambda: fill_timelines(users))
+            self.step('stats', lambda: UserStats.objects.rebuild(users))
+            self.stdout.write('search index...')
+        invalidate_counts()
+        bump('posts')
+        self.stdout.write(
+            f'done in {time.perf_counter() - started:.0f} s'
+        )
+
+    def prepare(self, options):
+        chooser = random.Random(options['seed'])
+        fake = Faker('ru_RU')
+        fake.seed_instance(options['seed'])
+        now = timezone.now()
+        first = {
+            model: (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+            for model in (User, Group, Post, Comment)
+        }
+        Group.objects.bulk_create(
+            Group(
+                id=first[Group] + number,
+                title=fake.catch_phrase()[:200],
+                slug=f'group-{first[Group] + number}',
+                description=fake.paragraph(),
+            )
+            for number in range(options['groups'])
+        )
+        state.clear()
+        state.update(
+            seed=options['seed'],
+            batch=options['batch'],
+            follows=options['follows'],
+            now=now,
+            start=now - timedelta(days=options['days']),
+            days=options['days'],
+            password=make_password(options['password']),
+            users=(first[User], options['users']),
+            groups=(first[Group], options['groups']),
+            posts=(first[Post], options['posts']),
+            comments=(first[Comment], options['comments']),
+            popularity=zipf_weights(options['users'], options['exponent']),
+            activity=zipf_weights(
+                options['users'], options['exponent'], chooser
+            ),
+            group_weights=zipf_weights(
+                options['groups'], options['exponent'], chooser
+            ),
+        )
+
+    def run(self, kinds, options):
+        """Генерирует строки kinds порциями, параллельно в воркерах."""
+        totals = {'follows': options['users']}
+        tasks = [
+            (kind, start, min(start + options['chunk'], total))
+            for kind in kinds
+            for total in [totals.get(kind, options[kind])]
+            for start in range(0, total, options['chunk'])
+        ]
+        started = time.perf_counter()
+        if options['workers']:
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(
+                options['workers']
+            ) as pool:
+                rows = sum(pool.imap_unordered(generate, tasks))
+        else:
+            rows = sum(map(generate, tasks))
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            f'{", ".join(kinds)}: {rows} rows in {seconds:.1f} s '
+            f'({rows / seconds:.0f} rows/s)'
+        )
+
+    def step(self, name, action):
+        started = time.perf_counter()
+        rows = action()
+        self.stdout.write(
+            f'{name}: {rows} rows in {time.perf_counter() - started:.1f} s'
+        )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Заново строит полнотекстовый индекс постов и комментариев.'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('Поиск FTS5 доступен только для SQLite.')
+        self.stdout.write(f'Проиндексировано текстов: {search.rebuild()}')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import UserStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики активности пользователей.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'Пересчитано пользователей: {UserStats.objects.rebuild()}'
+        )
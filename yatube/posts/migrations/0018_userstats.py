@@ -0,0 +1,30 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0017_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+                ('follows', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+            ],
+            options={
+                'verbose_name': 'Активность пользователя',
+                'verbose_name_plural': 'Активность пользователей',
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_composite_indexes'),
+    ]
+
+    # width_field и height_field не меняют схему, а пересоздание таблицы
+    # в SQLite удалило бы триггеры поискового индекса.
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, null=True, upload_to='posts/', verbose_name='Изображение'),
+            ),
+        ]),
+    ]
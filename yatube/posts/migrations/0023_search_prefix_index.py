@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from posts import search
+
+
+def recreate_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in search.DROP_SQL + search.CREATE_SQL + search.REBUILD_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    """Пересоздает индекс posts_search с префиксными индексами FTS5."""
+
+    dependencies = [
+        ('posts', '0022_post_image_without_dimension_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_index, migrations.RunPython.noop),
+    ]
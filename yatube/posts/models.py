@@ -1,12 +1,22 @@
+from itertools import islice
+
 from core.models import CreatedModel
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, router
+from django.db.models import Count, F, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import search
+from .constants import SEARCH_CANDIDATES, STATS_BATCH_SIZE
 
 User = get_user_model()
 POST_DATA = '{text:.15}, {date:%Y-%m-%d}, {author}, {group}'
 COMMENT_DATA = '{text:.15}, {date:%Y-%m-%d}, {author}, {post:.15}'
 FOLLOW_DATA = '{user} подписан на {author}'
+TIMELINE_DATA = '{user}: {post:.15}'
+SEARCH_DATA = '{text:.15}'
+STATS_DATA = '{user}: {posts} / {comments} / {follows} / {followers}'
 
 
 class Group(models.Model):
@@ -26,6 +36,17 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Посты для лент: автор и группа одним запросом, без лишних полей."""
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'image', 'image_width', 'image_height',
+            'author', 'group',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__title', 'group__slug',
+        )
+
+
 class Post(CreatedModel):
     group = models.ForeignKey(
         Group,
@@ -42,11 +63,51 @@ class Post(CreatedModel):
         blank=True,
         null=True
     )
+    image_width = models.PositiveIntegerField(
+        verbose_name='Ширина изображения',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        verbose_name='Высота изображения',
+        blank=True,
+        null=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta(CreatedModel.Meta):
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
+    def save(self, *args, **kwargs):
+        # Размеры читаются только из нового файла: width_field открывал бы
+        # хранилище при каждой загрузке поста из базы.
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'image' in update_fields:
+            if not self.image:
+                self.image_width = self.image_height = None
+            elif not self.image._committed:
+                self.image_width = self.image.width
+                self.image_height = self.image.height
+            if update_fields is not None:
+                kwargs['update_fields'] = {
+                    *update_fields, 'image_width', 'image_height'
+                }
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return POST_DATA.format(
             text=self.text,
@@ -65,6 +126,12 @@ class Comment(CreatedModel):
     )
 
     class Meta(CreatedModel.Meta):
+        indexes = [
+            models.Index(
+                fields=['post', '-pub_date', '-id'],
+                name='comment_post_date_idx'
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -77,6 +144,80 @@ class Comment(CreatedModel):
         )
 
 
+class SearchTextField(models.TextField):
+    """Текстовая колонка таблицы FTS5 с поиском через lookup match."""
+
+
+@SearchTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+class SearchEntryQuerySet(models.QuerySet):
+    def ranked(self, query):
+        """Посты, в тексте или комментариях которых есть все слова запроса.
+
+        Словари с post_id и search_rank - лучшей оценкой bm25 среди
+        совпавших текстов поста: чем она меньше, тем выше пост в выдаче.
+        Оцениваются только SEARCH_CANDIDATES совпадений с наибольшим rowid
+        (самые новые тексты): иначе bm25 для частого слова считался бы
+        по всему индексу.
+        """
+        match = search.fts_query(query)
+        if not match or not search.is_supported():
+            return self.none().values('post_id').annotate(
+                search_rank=Min('rank')
+            )
+        hits = self.filter(text__match=match)
+        oldest = hits.order_by('-id').values('id')[
+            SEARCH_CANDIDATES - 1:SEARCH_CANDIDATES
+        ]
+        return hits.filter(
+            id__gte=Coalesce(Subquery(oldest), 0)
+        ).values('post_id').annotate(search_rank=Min('rank'))
+
+
+class SearchEntry(models.Model):
+    """Строка поискового индекса posts_search (см. posts.search).
+
+    Таблицу создает миграция, а заполняют триггеры базы данных.
+    """
+    id = models.IntegerField(primary_key=True, db_column='rowid')
+    text = SearchTextField('Текст')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='search_entries',
+        verbose_name='Пост',
+    )
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name='Комментарий',
+    )
+    rank = models.FloatField('Оценка совпадения', editable=False)
+
+    objects = SearchEntryQuerySet.as_manager()
+
+    class Meta:
+        managed = False
+        db_table = search.SEARCH_TABLE
+        verbose_name = 'Запись поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+
+    def __str__(self):
+        return SEARCH_DATA.format(text=self.text)
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -99,6 +240,12 @@ class Follow(models.Model):
                 name='unique_subscription'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            )
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 
@@ -107,3 +254,140 @@ class Follow(models.Model):
             user=self.user.username,
             author=self.author.username
         )
+
+
+class Timeline(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-id'],
+                name='timeline_user_date_idx'
+            )
+        ]
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return TIMELINE_DATA.format(
+            user=self.user.username,
+            post=self.post.text
+        )
+
+
+def count_by(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+class UserStatsManager(models.Manager):
+    COUNTERS = ('posts', 'comments', 'follows', 'followers')
+
+    def rebuild(self, users=None):
+        """Пересчитывает счетчики пользователей (по умолчанию - всех)."""
+        users = (User.objects.all() if users is None else users).annotate(
+            posts_total=count_by(Post, 'author'),
+            comments_total=count_by(Comment, 'author'),
+            follows_total=count_by(Follow, 'user'),
+            followers_total=count_by(Follow, 'author'),
+        ).values_list(
+            'pk', 'posts_total', 'comments_total',
+            'follows_total', 'followers_total'
+        ).order_by('pk').iterator(chunk_size=STATS_BATCH_SIZE)
+        rebuilt = 0
+        while True:
+            batch = [
+                UserStats(
+                    user_id=user_id, posts=posts, comments=comments,
+                    follows=follows, followers=followers
+                )
+                for user_id, posts, comments, follows, followers
+                in islice(users, STATS_BATCH_SIZE)
+            ]
+            if not batch:
+                return rebuilt
+            self.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=self.COUNTERS
+            )
+            rebuilt += len(batch)
+
+    def for_user(self, user):
+        """Счетчики пользователя; отсутствующие пересчитываются."""
+        try:
+            return self.get(user=user)
+        except UserStats.DoesNotExist:
+            self.rebuild(User.objects.filter(pk=user.pk))
+            # Пересчитанная строка есть пока только в основной базе.
+            return self.db_manager(
+                router.db_for_write(self.model)
+            ).get(user=user)
+
+    def bump(self, user_id, **deltas):
+        """Сдвигает счетчики пользователя одним UPDATE.
+
+        Отсутствующую строку не создает: ее пересчитает for_user, а при
+        каскадном удалении пользователя она ссылалась бы на удаленного.
+        """
+        self.filter(user_id=user_id).update(
+            **{name: F(name) + delta for name, delta in deltas.items()}
+        )
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts = models.PositiveIntegerField('Записей', default=0)
+    comments = models.PositiveIntegerField('Комментариев', default=0)
+    follows = models.PositiveIntegerField('Подписок', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+
+    objects = UserStatsManager()
+
+    class Meta:
+        verbose_name = 'Активность пользователя'
+        verbose_name_plural = 'Активность пользователей'
+
+    def __str__(self):
+        return STATS_DATA.format(
+            user=self.user.username,
+            posts=self.posts,
+            comments=self.comments,
+            follows=self.follows,
+            followers=self.followers
+        )
@@ -0,0 +1,203 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .constants import PAGE_RANGE_ON_EACH_SIDE, PAGE_RANGE_ON_ENDS
+from .counts import cached_count
+
+NEXT = 'n'
+PREVIOUS = 'p'
+SCALARS = (str, int, float, type(None))
+
+
+def encode_cursor(direction, number, values):
+    """Упаковывает позицию в ленте в непрозрачную строку."""
+    data = json.dumps([
+        direction,
+        number,
+        [value.isoformat() if hasattr(value, 'isoformat') else value
+         for value in values]
+    ], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Распаковывает курсор, для испорченного курсора возвращает None."""
+    try:
+        direction, number, values = json.loads(
+            base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        )
+    except (binascii.Error, TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if (direction not in (NEXT, PREVIOUS) or not isinstance(number, int)
+            or not isinstance(values, list)
+            or not all(isinstance(value, SCALARS) for value in values)):
+        return None
+    return direction, max(number, 1), values
+
+
+class CursorPage(Page):
+    """Страница, знающая курсоры соседних страниц."""
+
+    def __init__(self, object_list, number, paginator,
+                 has_next=None, has_previous=None):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        if self._has_next is None:
+            return super().has_next()
+        return self._has_next
+
+    def has_previous(self):
+        if self._has_previous is None:
+            return super().has_previous()
+        return self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    @property
+    def elided_page_range(self):
+        """Номера страниц вокруг текущей и по краям, вместо всего списка."""
+        return self.paginator.get_elided_page_range(
+            min(self.number, self.paginator.num_pages),
+            on_each_side=PAGE_RANGE_ON_EACH_SIDE,
+            on_ends=PAGE_RANGE_ON_ENDS
+        )
+
+    @property
+    def next_cursor(self):
+        if not self.object_list or not self.has_next():
+            return None
+        return encode_cursor(
+            NEXT,
+            self.next_page_number(),
+            self.paginator.cursor_values(self.object_list[-1])
+        )
+
+    @property
+    def previous_cursor(self):
+        if not self.object_list or not self.has_previous():
+            return None
+        return encode_cursor(
+            PREVIOUS,
+            self.previous_page_number(),
+            self.paginator.cursor_values(self.object_list[0])
+        )
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор, перелистывающий ленту по ключу (keys) вместо OFFSET.
+
+    Лента упорядочена по убыванию ключей (по возрастанию при
+    descending=False). Переход по курсору выполняется
+    одним запросом с условием по ключу и LIMIT и не требует COUNT(*).
+    Обычные номера страниц (?page=N) обслуживаются по-прежнему через OFFSET.
+    Общее число объектов кэшируется, а при estimate=True для больших таблиц
+    заменяется оценкой.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 estimate=False, descending=True, **kwargs):
+        self.keys = tuple(keys)
+        self.estimate = estimate
+        self.descending = descending
+        super().__init__(
+            object_list.order_by(
+                *(f'-{key}' if descending else key for key in self.keys)
+            ),
+            per_page,
+            **kwargs
+        )
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.estimate)
+
+    def cursor_values(self, obj):
+        if isinstance(obj, dict):
+            return [obj[key] for key in self.keys]
+        return [getattr(obj, key) for key in self.keys]
+
+    def _seek(self, values, lookup):
+        condition = Q()
+        for position, key in enumerate(self.keys):
+            condition |= Q(
+                **{
+                    earlier: values[index]
+                    for index, earlier in enumerate(self.keys[:position])
+                },
+                **{f'{key}__{lookup}': values[position]}
+            )
+        return condition
+
+    def _get_page(self, *args, **kwargs):
+        return CursorPage(*args, **kwargs)
+
+    def first_page(self):
+        """Первая страница без подсчета общего числа объектов."""
+        object_list = list(self.object_list[:self.per_page + 1])
+        return self._get_page(
+            object_list[:self.per_page], 1, self,
+            has_next=len(object_list) > self.per_page,
+            has_previous=False
+        )
+
+    def get_cursor_page(self, cursor):
+        """Возвращает страницу по курсору.
+
+        Испорченный курсор ведет на первую страницу, а курсор, за которым
+        не осталось объектов, - на страницу с тем же номером по OFFSET.
+        """
+        decoded = decode_cursor(cursor)
+        if decoded is None or len(decoded[2]) != len(self.keys):
+            return self.first_page()
+        direction, number, values = decoded
+        after, before = ('lt', 'gt') if self.descending else ('gt', 'lt')
+        try:
+            seek = self.object_list.filter(
+                self._seek(values, after if direction == NEXT else before)
+            )
+        except (ValidationError, TypeError, ValueError):
+            return self.first_page()
+        if direction == NEXT:
+            object_list = list(seek[:self.per_page + 1])
+            has_next = len(object_list) > self.per_page
+            has_previous = True
+            object_list = object_list[:self.per_page]
+        else:
+            object_list = list(seek.reverse()[:self.per_page + 1])
+            has_previous = len(object_list) > self.per_page
+            if not has_previous:
+                return self.first_page()
+            has_next = True
+            object_list = object_list[:self.per_page][::-1]
+        if not object_list:
+            return self.get_page(number)
+        return self._get_page(
+            object_list, number, self,
+            has_next=has_next,
+            has_previous=has_previous
+        )
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор с кэшируемым количеством, для больших таблиц - оценкой.
+
+    Для списков в админке, где точное число строк не стоит COUNT(*)
+    по всей таблице на каждой странице.
+    """
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, estimate=True)
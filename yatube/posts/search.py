@@ -0,0 +1,189 @@
+"""Полнотекстовый поиск по постам и комментариям (SQLite FTS5).
+
+Таблица posts_search хранит тексты постов (rowid = 2 * id) и комментариев
+(rowid = 2 * id + 1). Ее поддерживают триггеры на posts_post и
+posts_comment, так что индекс не расходится с данными при любом способе
+записи, включая bulk_create и update().
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import (DEFAULT_DB_ALIAS, connection, connections,
+                       transaction)
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .constants import (SEARCH_MAX_TERMS, SEARCH_PREFIX_MIN_LENGTH,
+                        SEARCH_SNIPPET_TOKENS)
+
+SEARCH_TABLE = 'posts_search'
+CREATE_SQL = (
+    '''CREATE VIRTUAL TABLE posts_search USING fts5(
+        text, post_id UNINDEXED, comment_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_search_post_insert
+    AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO posts_search (rowid, text, post_id)
+        VALUES (2 * new.id, new.text, new.id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_search_post_update
+    AFTER UPDATE OF text ON posts_post
+    BEGIN
+        UPDATE posts_search SET text = new.text WHERE rowid = 2 * new.id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_search_post_delete
+    AFTER DELETE ON posts_post
+    BEGIN
+        DELETE FROM posts_search WHERE rowid = 2 * old.id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_search_comment_insert
+    AFTER INSERT ON posts_comment
+    BEGIN
+        INSERT INTO posts_search (rowid, text, post_id, comment_id)
+        VALUES (2 * new.id + 1, new.text, new.post_id, new.id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_search_comment_update
+    AFTER UPDATE OF text, post_id ON posts_comment
+    BEGIN
+        UPDATE posts_search SET text = new.text, post_id = new.post_id
+        WHERE rowid = 2 * new.id + 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS posts_search_comment_delete
+    AFTER DELETE ON posts_comment
+    BEGIN
+        DELETE FROM posts_search WHERE rowid = 2 * old.id + 1;
+    END''',
+)
+TRIGGERS_SQL = CREATE_SQL[1:]
+TRIGGERS = (
+    'posts_search_post_insert',
+    'posts_search_post_update',
+    'posts_search_post_delete',
+    'posts_search_comment_insert',
+    'posts_search_comment_update',
+    'posts_search_comment_delete',
+)
+DROP_SQL = tuple(
+    f'DROP TRIGGER IF EXISTS {name}' for name in TRIGGERS
+) + ('DROP TABLE IF EXISTS posts_search',)
+REBUILD_SQL = (
+    'DELETE FROM posts_search',
+    '''INSERT INTO posts_search (rowid, text, post_id)
+    SELECT 2 * id, text, id FROM posts_post''',
+    '''INSERT INTO posts_search (rowid, text, post_id, comment_id)
+    SELECT 2 * id + 1, text, post_id, id FROM posts_comment''',
+    "INSERT INTO posts_search (posts_search) VALUES ('optimize')",
+)
+SNIPPET_SQL = '''
+    SELECT post_id, comment_id, snippet(posts_search, 0, %s, %s, '…', %s)
+    FROM posts_search
+    WHERE posts_search MATCH %s AND post_id IN ({})
+    ORDER BY rank
+'''
+WORD = re.compile(r'\w+')
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def fts_query(text):
+    """Запрос FTS5 из произвольной строки пользователя.
+
+    Каждое слово берется в кавычки, так что синтаксис FTS5 во вводе не
+    работает и не вызывает ошибок; слова объединяются по И. Слова не
+    короче SEARCH_PREFIX_MIN_LENGTH ищутся как префиксы, более короткие -
+    целиком: префикс в одну-две буквы совпал бы почти со всем индексом.
+    """
+    return ' '.join(
+        '"{}"{}'.format(
+            word, '*' if len(word) >= SEARCH_PREFIX_MIN_LENGTH else ''
+        )
+        for word in WORD.findall(text)[:SEARCH_MAX_TERMS]
+    )
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def snippets(query, post_ids):
+    """Фрагменты лучших совпадений для постов страницы.
+
+    Возвращает {id поста: (фрагмент с <mark>, найдено ли в комментарии)}.
+    """
+    match = fts_query(query)
+    if not match or not post_ids or not is_supported():
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            SNIPPET_SQL.format(', '.join(['%s'] * len(post_ids))),
+            [MARK_START, MARK_END, SEARCH_SNIPPET_TOKENS, match, *post_ids]
+        )
+        found = {}
+        for post_id, comment_id, snippet in cursor.fetchall():
+            found.setdefault(
+                post_id, (highlight(snippet), comment_id is not None)
+            )
+    return found
+
+
+def rebuild():
+    """Заново заполняет индекс из posts_post и posts_comment."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        for statement in REBUILD_SQL:
+            cursor.execute(statement)
+        cursor.execute(f'SELECT count(*) FROM {SEARCH_TABLE}')
+        return cursor.fetchone()[0]
+
+
+@contextmanager
+def deferred_index():
+    """Отключает триггеры индекса на время массовой загрузки.
+
+    После загрузки триггеры создаются заново, а индекс перестраивается
+    целиком: это в разы быстрее, чем обновлять его на каждую строку.
+    """
+    if not is_supported():
+        yield
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP_SQL[:len(TRIGGERS_SQL)]:
+            cursor.execute(statement)
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for statement in TRIGGERS_SQL:
+                cursor.execute(statement)
+        rebuild()
+
+
+def restore_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Создает пропавшие триггеры индекса; подключен к post_migrate.
+
+    Меняя схему, SQLite пересоздает таблицу, и триггеры на posts_post и
+    posts_comment пропадают без ошибок. Пока их не было, индекс мог
+    отстать от данных, поэтому после восстановления он перестраивается.
+    """
+    database = connections[using]
+    if (database.vendor != 'sqlite'
+            or SEARCH_TABLE not in database.introspection.table_names()):
+        return
+    with transaction.atomic(using=using), database.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+            f"AND name IN ({', '.join(['%s'] * len(TRIGGERS))})", TRIGGERS
+        )
+        if cursor.fetchone()[0] == len(TRIGGERS):
+            return
+        for statement in TRIGGERS_SQL + REBUILD_SQL:
+            cursor.execute(statement)
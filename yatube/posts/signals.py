@@ -0,0 +1,173 @@
+from core.cache import bump
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .constants import TIMELINE_BATCH_SIZE
+from .counts import invalidate_counts
+from .thumbnails import schedule
+from .models import Comment, Follow, Group, Post, Timeline, User, UserStats
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """Новый пост попадает в ленты всех подписчиков автора."""
+    if not created:
+        return
+    Timeline.objects.bulk_create(
+        (
+            Timeline(
+                user_id=user_id, post=instance, pub_date=instance.pub_date
+            )
+            for user_id in Follow.objects.filter(
+                author_id=instance.author_id
+            ).values_list('user_id', flat=True).iterator()
+        ),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """При подписке посты автора добавляются в ленту подписчика."""
+    if not created:
+        return
+    Timeline.objects.bulk_create(
+        (
+            Timeline(user_id=instance.user_id, post_id=post_id,
+                     pub_date=pub_date)
+            for post_id, pub_date in Post.objects.filter(
+                author_id=instance.author_id
+            ).values_list('id', 'pub_date').iterator()
+        ),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    """При отписке посты автора удаляются из ленты подписчика."""
+    Timeline.objects.filter(
+        user_id=instance.user_id,
+        post__author_id=instance.author_id
+    ).delete()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reset_counts(sender, **kwargs):
+    """Изменение постов, подписок и комментариев меняет количества
+    в лентах и списках админки."""
+    invalidate_counts()
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.bump(
+            instance.author_id, **{f'{sender._meta.model_name}s': 1}
+        )
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def count_deleted(sender, instance, **kwargs):
+    UserStats.objects.bump(
+        instance.author_id, **{f'{sender._meta.model_name}s': -1}
+    )
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.bump(instance.user_id, follows=1)
+        UserStats.objects.bump(instance.author_id, followers=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_unfollow(sender, instance, **kwargs):
+    UserStats.objects.bump(instance.user_id, follows=-1)
+    UserStats.objects.bump(instance.author_id, followers=-1)
+
+
+def profile_scopes(*user_ids):
+    return [
+        f'profile:{username}' for username in User.objects.filter(
+            pk__in=user_ids
+        ).values_list('username', flat=True)
+    ]
+
+
+def group_scopes(*group_ids):
+    return [
+        f'group:{slug}' for slug in Group.objects.filter(
+            pk__in=[group_id for group_id in group_ids if group_id]
+        ).values_list('slug', flat=True)
+    ]
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Запоминает прежнюю группу поста, чтобы сбросить и ее страницы."""
+    instance._previous_group_id = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group_id', flat=True).first() if instance.pk else None
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance._previous_slug = Group.objects.filter(
+        pk=instance.pk
+    ).values_list('slug', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def reset_post_pages(sender, instance, **kwargs):
+    bump(
+        'posts',
+        *profile_scopes(instance.author_id),
+        *group_scopes(
+            instance.group_id, getattr(instance, '_previous_group_id', None)
+        )
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def reset_group_pages(sender, instance, **kwargs):
+    bump(
+        'posts',
+        f'group:{instance.slug}',
+        f'group:{getattr(instance, "_previous_slug", instance.slug)}'
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reset_comment_pages(sender, instance, **kwargs):
+    bump(f'post:{instance.post_id}', *profile_scopes(instance.author_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def reset_follow_profiles(sender, instance, **kwargs):
+    bump(*profile_scopes(instance.user_id, instance.author_id))
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, **kwargs):
+    if instance.image:
+        schedule(instance.image.name)
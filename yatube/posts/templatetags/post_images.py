@@ -0,0 +1,53 @@
+from django import template
+
+from .. import thumbnails
+from ..constants import (THUMBNAIL_FALLBACK_FORMAT, THUMBNAIL_FORMATS,
+                         THUMBNAIL_RATIO, THUMBNAIL_SIZES, THUMBNAIL_WIDTHS)
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(image, layout='listing'):
+    """Картинка поста с srcset из готовых вариантов.
+
+    Ширины больше исходной картинки в srcset не попадают. Пока варианты
+    не построены, они ставятся в очередь, а шаблон показывает заглушку.
+    """
+    context = {
+        'image': image,
+        'sizes': THUMBNAIL_SIZES[layout],
+        'width': THUMBNAIL_RATIO[0],
+        'height': THUMBNAIL_RATIO[1],
+    }
+    if not image:
+        return context
+    post = image.instance
+    if not hasattr(post, '_prefetched_thumbnails'):
+        thumbnails.prefetch([post])
+    ready = post._prefetched_thumbnails
+    if None in ready.values():
+        thumbnails.schedule(image.name)
+    widths = [
+        width for width in THUMBNAIL_WIDTHS
+        if width == THUMBNAIL_WIDTHS[0] or not post.image_width
+        or width <= post.image_width
+    ]
+    sources = {}
+    for image_format, content_type in THUMBNAIL_FORMATS.items():
+        variants = [
+            (width, ready[width, image_format]) for width in widths
+            if ready[width, image_format] is not None
+        ]
+        if variants:
+            sources[image_format] = {
+                'type': content_type,
+                'srcset': ', '.join(
+                    f'{thumbnail.url} {width}w'
+                    for width, thumbnail in variants
+                ),
+                'src': variants[-1][1].url,
+            }
+    context['fallback'] = sources.pop(THUMBNAIL_FALLBACK_FORMAT, None)
+    context['sources'] = sources.values()
+    return context
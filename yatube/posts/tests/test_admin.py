@@ -0,0 +1,168 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import bulk
+from ..models import Comment, Follow, Group, Post, Timeline, User, UserStats
+
+USERS = 5
+CHANGELISTS = {
+    'post': reverse('admin:posts_post_changelist'),
+    'comment': reverse('admin:posts_comment_changelist'),
+    'follow': reverse('admin:posts_follow_changelist'),
+}
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = Client()
+        cls.superuser = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_slug', description='Группа'
+        )
+        cls.users = [
+            User.objects.create(username=f'reader_{number}')
+            for number in range(USERS)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.admin.force_login(self.superuser)
+
+    def add_rows(self, users):
+        for user in users:
+            post = Post.objects.create(
+                text='Тестовый пост', author=user, group=self.group
+            )
+            Comment.objects.create(text='Комментарий', post=post, author=user)
+            Follow.objects.create(user=user, author=self.superuser)
+
+    def changelist_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.admin.get(url).status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Число запросов списка не зависит от числа строк."""
+        self.add_rows(self.users[:1])
+        few = {
+            name: self.changelist_queries(url)
+            for name, url in CHANGELISTS.items()
+        }
+        self.add_rows(self.users[1:])
+        for name, url in CHANGELISTS.items():
+            with self.subTest(changelist=name):
+                self.assertEqual(self.changelist_queries(url), few[name])
+
+    def test_filters_do_not_list_all_users(self):
+        """Фильтры по пользователям показывают только выбранного."""
+        self.add_rows(self.users)
+        selected = self.users[0]
+        response = self.admin.get(
+            CHANGELISTS['follow'], {'user__id__exact': selected.id}
+        )
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(response, selected.username)
+        for user in self.users[1:]:
+            self.assertNotContains(response, user.username)
+
+    def test_malformed_filter_value(self):
+        """Негодное значение фильтра ведет на список с ?e=1, а не к 500."""
+        for name, parameter in (('post', 'author__id__exact'),
+                                ('follow', 'user__id__exact')):
+            with self.subTest(changelist=name):
+                self.assertRedirects(
+                    self.admin.get(CHANGELISTS[name], {parameter: 'abc'}),
+                    f'{CHANGELISTS[name]}?e=1',
+                    fetch_redirect_response=False
+                )
+
+    def test_search_uses_full_text_index(self):
+        """Поиск по постам и комментариям идет через индекс FTS5."""
+        post = Post.objects.create(text='Редкое слово', author=self.superuser)
+        Comment.objects.create(
+            text='Особый комментарий', post=post, author=self.superuser
+        )
+        cases = [
+            ('post', 'редкое', post),
+            ('comment', 'особый', post.comments.get()),
+        ]
+        for name, query, expected in cases:
+            with self.subTest(changelist=name):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.admin.get(CHANGELISTS[name], {'q': query})
+                self.assertEqual(
+                    list(response.context['cl'].result_list), [expected]
+                )
+                self.assertTrue(
+                    any('MATCH' in query['sql'] for query in queries)
+                )
+
+    def run_action(self, name, action, rows, **data):
+        return self.admin.post(CHANGELISTS[name], {
+            'action': action,
+            '_selected_action': [row.pk for row in rows],
+            **data,
+        })
+
+    def test_move_and_detach_posts(self):
+        """Посты переносятся в группу и убираются из групп пачками,
+        страницы группы сбрасываются."""
+        other = Group.objects.create(
+            title='Другая группа', slug='other_slug', description='Группа'
+        )
+        self.add_rows(self.users)
+        posts = list(Post.objects.all())
+        group_page = reverse('posts:group_list', args=[other.slug])
+        self.assertNotContains(self.admin.get(group_page), 'Тестовый пост')
+        self.run_action('post', 'move_to_group', posts, group=other.pk)
+        self.assertEqual(
+            set(Post.objects.values_list('group', flat=True)), {other.pk}
+        )
+        self.assertContains(self.admin.get(group_page), 'Тестовый пост')
+        self.run_action('post', 'detach_group', posts[:2])
+        self.assertEqual(Post.objects.filter(group=None).count(), 2)
+
+    def test_bulk_queries_do_not_grow_with_rows(self):
+        """Число запросов зависит от числа пачек, а не строк."""
+        self.add_rows(self.users)
+        queries = []
+        for posts in (Post.objects.filter(author=self.users[0]),
+                      Post.objects.all()):
+            with CaptureQueriesContext(connection) as captured:
+                bulk.move_posts(posts, None)
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(Post.objects.filter(group=None).count(), USERS)
+        self.assertEqual(
+            [len(batch) for batch in bulk.batches(Post.objects.all(), 2)],
+            [2, 2, 1]
+        )
+
+    def test_remove_follows(self):
+        """Подписки удаляются вместе с лентами и счетчиками."""
+        self.add_rows(self.users)
+        author_post = Post.objects.create(
+            text='Пост администратора', author=self.superuser
+        )
+        follows = list(Follow.objects.all())
+        self.assertEqual(
+            Timeline.objects.filter(post=author_post).count(), USERS
+        )
+        self.run_action('follow', 'remove_follows', follows[:2])
+        self.assertEqual(Follow.objects.count(), USERS - 2)
+        self.assertEqual(
+            Timeline.objects.filter(post=author_post).count(), USERS - 2
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.superuser).followers, USERS - 2
+        )
+        self.assertEqual(UserStats.objects.get(user=self.users[0]).follows, 0)
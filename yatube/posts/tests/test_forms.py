@@ -1,12 +1,16 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from ..constants import IMAGE_MAX_SIZE
 from ..models import Comment, Group, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -20,10 +24,32 @@ SMALL_GIF = (
     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
     b'\x0A\x00\x3B'
 )
+SMALL_XPM = (
+    b'/* XPM */\n'
+    b'static char *icon[] = {\n'
+    b'"2 2 2 1",\n'
+    b'"a c #FF0000",\n'
+    b'"b c #00FF00",\n'
+    b'"ab",\n'
+    b'"ba"\n'
+    b'};\n'
+)
 PROFILE = reverse('posts:profile', args=[USERNAME])
 POST_CREATE = reverse('posts:post_create')
 
 
+def make_jpeg(name, size, orientation=None):
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile(
+        name=name, content=buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostCreateFormTests(TestCase):
     @classmethod
@@ -223,3 +249,61 @@ class PostCreateFormTests(TestCase):
                 self.assertEqual(post.author, self.post.author)
                 self.assertEqual(post.group.id, self.post.group.id)
                 self.assertEqual(post.image, self.post.image)
+
+    def test_uploaded_image_is_normalized(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет EXIF,
+        а ее размеры записываются в пост."""
+        cases = [
+            ('large.jpg', (IMAGE_MAX_SIZE * 2, IMAGE_MAX_SIZE), None,
+             (IMAGE_MAX_SIZE, IMAGE_MAX_SIZE // 2)),
+            ('rotated.jpg', (40, 20), 6, (20, 40)),
+        ]
+        for name, size, orientation, expected in cases:
+            with self.subTest(name=name):
+                posts = set(Post.objects.all())
+                self.author_client.post(POST_CREATE, data={
+                    'text': 'Пост с фотографией',
+                    'image': make_jpeg(name, size, orientation),
+                })
+                post = (set(Post.objects.all()) - posts).pop()
+                self.assertEqual(
+                    post.image.name,
+                    '{}{}'.format(settings.IMAGES_DIRECTORY, name)
+                )
+                self.assertEqual(
+                    (post.image_width, post.image_height), expected
+                )
+                with Image.open(post.image.path) as image:
+                    self.assertEqual(image.size, expected)
+                    self.assertEqual(len(image.getexif()), 0)
+
+    def test_read_only_format_is_converted(self):
+        """Картинка в формате, который Pillow не умеет записывать,
+        сохраняется в PNG."""
+        posts = set(Post.objects.all())
+        response = self.author_client.post(POST_CREATE, data={
+            'text': 'Пост с XPM',
+            'image': SimpleUploadedFile(
+                name='icon.xpm', content=SMALL_XPM, content_type='image/x-xpm'
+            ),
+        })
+        self.assertRedirects(response, PROFILE)
+        post = (set(Post.objects.all()) - posts).pop()
+        self.assertEqual(
+            post.image.name, f'{settings.IMAGES_DIRECTORY}icon.png'
+        )
+        self.assertEqual((post.image_width, post.image_height), (2, 2))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'PNG')
+
+    def test_decompression_bomb_is_rejected(self):
+        """Слишком большая по заголовку картинка отклоняется формой."""
+        posts = set(Post.objects.all())
+        with mock.patch('posts.images.IMAGE_MAX_PIXELS', 100):
+            response = self.author_client.post(POST_CREATE, data={
+                'text': 'Пост с бомбой',
+                'image': make_jpeg('bomb.jpg', (20, 20)),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.assertEqual(set(Post.objects.all()), posts)
@@ -0,0 +1,41 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Count, F
+from django.test import TestCase
+
+from ..models import (Comment, Follow, Group, Post, SearchEntry, Timeline,
+                      User, UserStats)
+
+
+class GenerateDataTest(TestCase):
+    def test_generate_data(self):
+        """generate_data создает связные данные, ленты, счетчики и индекс
+        поиска, не мешая обычному созданию постов."""
+        call_command(
+            'generate_data', users=30, groups=3, posts=200, comments=300,
+            follows=4, workers=0, chunk=70, stdout=StringIO()
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertEqual(
+            Timeline.objects.count(),
+            Follow.objects.aggregate(
+                total=Count('author__posts')
+            )['total']
+        )
+        self.assertFalse(
+            Comment.objects.filter(pub_date__lt=F('post__pub_date')).exists()
+        )
+        self.assertEqual(UserStats.objects.count(), 30)
+        self.assertEqual(SearchEntry.objects.count(), 500)
+        dates = Post.objects.values_list('pub_date', flat=True)
+        self.assertLess(min(dates), max(dates))
+        post = Post.objects.create(
+            text='Новый пост', author=User.objects.first()
+        )
+        self.assertGreater(post.pub_date, max(dates))
+        self.assertEqual(SearchEntry.objects.count(), 501)
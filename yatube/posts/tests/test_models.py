@@ -1,7 +1,10 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
 from ..models import (COMMENT_DATA, FOLLOW_DATA, POST_DATA, Comment, Follow,
-                      Group, Post, User)
+                      Group, Post, User, UserStats)
 
 
 class PostModelTest(TestCase):
@@ -53,3 +56,39 @@ class PostModelTest(TestCase):
         for object_name, expected_value in correct_object_names.items():
             with self.subTest(type(object_name).__name__):
                 self.assertEqual(str(object_name), expected_value)
+
+    def test_user_stats_follow_changes(self):
+        """Счетчики активности меняются вместе с постами, комментариями
+        и подписками и совпадают с пересчитанными командой."""
+        stats = {
+            self.user: (1, 0, 0, 1),
+            self.author_comment: (0, 1, 1, 0),
+        }
+        for user, expected in stats.items():
+            with self.subTest(user=user.username):
+                self.assertEqual(self.counters(user), expected)
+        Comment.objects.create(
+            text='Второй комментарий', author=self.user, post=self.post
+        )
+        Follow.objects.filter(pk=self.follow.pk).delete()
+        self.assertEqual(self.counters(self.user), (1, 1, 0, 0))
+        self.assertEqual(self.counters(self.author_comment), (0, 1, 0, 0))
+        UserStats.objects.all().delete()
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertEqual(self.counters(self.user), (1, 1, 0, 0))
+        self.assertEqual(self.counters(self.author_comment), (0, 1, 0, 0))
+
+    def test_delete_user_with_activity(self):
+        """Пользователь с постами, комментариями и подписками удаляется
+        вместе со своими счетчиками, счетчики остальных уменьшаются."""
+        self.assertEqual(self.counters(self.author_comment), (0, 1, 1, 0))
+        User.objects.get(pk=self.user.pk).delete()
+        self.assertFalse(
+            UserStats.objects.filter(user_id=self.user.pk).exists()
+        )
+        self.assertEqual(self.counters(self.author_comment), (0, 0, 0, 0))
+
+    @staticmethod
+    def counters(user):
+        stats = UserStats.objects.for_user(user)
+        return stats.posts, stats.comments, stats.follows, stats.followers
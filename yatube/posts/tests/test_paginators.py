@@ -0,0 +1,35 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..counts import cached_count, estimated_count
+from ..models import Post, User
+
+
+class CountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        Post.objects.create(text='Тестовый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_cached_until_posts_change(self):
+        """Количество берется из кэша, пока посты не изменились."""
+        posts = Post.objects.filter(author=self.author)
+        self.assertEqual(cached_count(posts), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(posts), 1)
+        Post.objects.create(text='Еще пост', author=self.author)
+        self.assertEqual(cached_count(posts), 2)
+        Post.objects.all().delete()
+        self.assertEqual(cached_count(posts), 0)
+
+    def test_estimated_count(self):
+        """Оценка дается только для запросов без фильтров."""
+        self.assertGreaterEqual(estimated_count(Post.objects.all()), 1)
+        self.assertIsNone(
+            estimated_count(Post.objects.filter(author=self.author))
+        )
+        self.assertEqual(cached_count(Post.objects.all(), estimate=True), 1)
@@ -0,0 +1,107 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..constants import COMMENTS_NUMBER, POSTS_NUMBER
+from ..models import Comment, Follow, Group, Post, User
+
+ROWS = POSTS_NUMBER + COMMENTS_NUMBER
+# Полный просмотр таблицы («SCAN t», но не «SCAN t USING INDEX») и
+# сортировка во временном B-дереве.
+BAD_PLAN = re.compile(r'^SCAN \w+$|USE TEMP B-TREE')
+# Ранжирование FTS5 сортирует только найденные записи и индексом
+# не заменяется.
+ALLOWED = {
+    'posts:search': re.compile(r'USE TEMP B-TREE'),
+}
+
+
+class QueryPlanTests(TestCase):
+    """Запросы представлений не просматривают таблицы целиком
+    и не сортируют результат во временных B-деревьях."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='auth')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_slug', description='Группа'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый пост {number}', author=cls.author,
+                 group=cls.group)
+            for number in range(ROWS)
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {number}', post=cls.post,
+                    author=cls.reader)
+            for number in range(ROWS)
+        )
+        cls.user_client = Client()
+
+    def setUp(self):
+        cache.clear()
+        self.user_client.force_login(self.reader)
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def get(self, url, params=None):
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            response = self.user_client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, [
+            (sql, self.explain(sql, params)) for sql, params in queries
+            if sql.lstrip().upper().startswith('SELECT')
+        ]
+
+    def assertGoodPlans(self, view_name, plans):
+        allowed = ALLOWED.get(view_name)
+        for sql, plan in plans:
+            for step in plan:
+                if allowed and allowed.search(step):
+                    continue
+                with self.subTest(step=step, sql=sql):
+                    self.assertIsNone(BAD_PLAN.search(step))
+
+    def test_views_use_indexes(self):
+        """Ленты, страницы постов и их продолжения по курсору."""
+        cases = [
+            ('posts:index', (), None),
+            ('posts:group_list', (self.group.slug,), None),
+            ('posts:profile', (self.author.username,), None),
+            ('posts:follow_index', (), None),
+            ('posts:post_detail', (self.post.id,), 'comments'),
+            ('posts:post_comments', (self.post.id,), 'comments'),
+            ('posts:search', (), None),
+        ]
+        for view_name, args, page in cases:
+            url = reverse(view_name, args=args)
+            params = {'q': 'тестовый'} if view_name == 'posts:search' else {}
+            with self.subTest(view=view_name):
+                response, plans = self.get(url, params)
+                self.assertGoodPlans(view_name, plans)
+                cursor = response.context[page or 'page_obj'].next_cursor
+                self.assertIsNotNone(cursor)
+                _, plans = self.get(url, {**params, 'cursor': cursor})
+                self.assertGoodPlans(view_name, plans)
+            if page is None and view_name != 'posts:search':
+                with self.subTest(view=view_name, page=2):
+                    _, plans = self.get(url, {'page': 2})
+                    self.assertGoodPlans(view_name, plans)
@@ -17,6 +17,8 @@ class RouteTests(TestCase):
             [f'/profile/{USERNAME}/', 'profile', USERNAME],
             [f'/posts/{POST_ID}/edit/', 'post_edit', POST_ID],
             [f'/posts/{POST_ID}/', 'post_detail', POST_ID],
+            [f'/posts/{POST_ID}/comments/', 'post_comments', POST_ID],
+            ['/search/', 'search'],
             ['/create/', 'post_create'],
             [f'/posts/{POST_ID}/comment/', 'add_comment', POST_ID],
             ['/follow/', 'follow_index'],
@@ -0,0 +1,146 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..constants import POSTS_NUMBER
+from ..models import Comment, Post, SearchEntry, User
+
+SEARCH = reverse('posts:search')
+
+
+def found(query):
+    return [hit['post_id'] for hit in SearchEntry.objects.ranked(query)]
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.guest = Client()
+        cls.author = User.objects.create(username='auth')
+        cls.once = Post.objects.create(
+            text='Кошка спит на диване', author=cls.author
+        )
+        cls.thrice = Post.objects.create(
+            text='Кошка, кошка и еще раз кошка', author=cls.author
+        )
+        cls.commented = Post.objects.create(
+            text='Про погоду', author=cls.author
+        )
+        Comment.objects.create(
+            text='А на крыше сидит кошка', post=cls.commented,
+            author=cls.author
+        )
+        Post.objects.create(text='Собака лает', author=cls.author)
+
+    def search(self, query, **params):
+        return self.guest.get(SEARCH, {'q': query, **params})
+
+    def test_search_ranks_posts_and_comments(self):
+        """Находятся посты и комментарии, лучшие совпадения - выше."""
+        response = self.search('кошка')
+        posts = response.context['posts']
+        self.assertEqual(
+            set(posts), {self.once, self.thrice, self.commented}
+        )
+        self.assertEqual(posts[0], self.thrice)
+        found = {post.id: post for post in posts}
+        self.assertIn('<mark>Кошка</mark>', found[self.once.id].snippet)
+        self.assertFalse(found[self.once.id].snippet_in_comment)
+        self.assertIn(
+            '<mark>кошка</mark>', found[self.commented.id].snippet
+        )
+        self.assertTrue(found[self.commented.id].snippet_in_comment)
+        self.assertContains(response, 'Комментарий: ')
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется триггерами при любых изменениях."""
+        post = Post.objects.create(text='Старый текст', author=self.author)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(found('старый'), [])
+        self.assertEqual(found('новый'), [post.id])
+        Post.objects.filter(id=post.id).update(text='Обновлен запросом')
+        self.assertEqual(found('запросом'), [post.id])
+        Comment.objects.filter(post=self.commented).delete()
+        self.assertNotIn(self.commented.id, found('кошка'))
+        post.delete()
+        self.assertEqual(found('запросом'), [])
+
+    def test_search_cursor_pagination(self):
+        """Выдача перелистывается курсором без повторов."""
+        Post.objects.bulk_create(
+            Post(text=f'Котенок номер {number}', author=self.author)
+            for number in range(POSTS_NUMBER + 3)
+        )
+        first = self.search('котенок').context['page_obj']
+        self.assertEqual(len(first), POSTS_NUMBER)
+        self.assertIsNone(first.previous_cursor)
+        second = self.search(
+            'котенок', cursor=first.next_cursor
+        ).context['page_obj']
+        self.assertEqual(len(second), 3)
+        self.assertIsNone(second.next_cursor)
+        self.assertFalse(
+            {hit['post_id'] for hit in first}
+            & {hit['post_id'] for hit in second}
+        )
+
+    def test_query_syntax_and_markup_are_escaped(self):
+        """Синтаксис FTS5 и разметка во вводе не ломают поиск."""
+        Post.objects.create(text='<b>кошка</b> в тегах', author=self.author)
+        for query in ('', '"', 'кошка OR (', 'NEAR(*', '^кошка'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query).status_code, 200)
+        response = self.search('кошка тег')
+        self.assertContains(response, '&lt;b&gt;<mark>кошка</mark>')
+
+    def test_short_words_are_not_prefixes(self):
+        """Короткие слова ищутся целиком, длинные - как префиксы."""
+        Post.objects.create(text='Кот и котлета', author=self.author)
+        self.assertEqual(len(found('ко')), 0)
+        self.assertEqual(len(found('кош')), 3)
+        self.assertEqual(len(found('котл')), 1)
+
+    def test_ranks_only_newest_candidates(self):
+        """Оцениваются только SEARCH_CANDIDATES совпадений с наибольшим
+        rowid, то есть самые новые посты и комментарии."""
+        newest = Post.objects.create(text='Кошка', author=self.author)
+        with mock.patch('posts.models.SEARCH_CANDIDATES', 2):
+            self.assertEqual(
+                set(found('кошка')), {newest.id, self.thrice.id}
+            )
+
+    def test_triggers_are_restored_after_migrate(self):
+        """Все триггеры индекса на месте, а пропавшие после пересоздания
+        таблицы появляются снова по сигналу post_migrate."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+            )
+            self.assertLessEqual(
+                set(search.TRIGGERS), {name for name, in cursor.fetchall()}
+            )
+            cursor.execute('DROP TRIGGER posts_search_post_insert')
+        post = Post.objects.create(text='Пропущенный пост', author=self.author)
+        self.assertEqual(found('пропущенный'), [])
+        emit_post_migrate_signal(0, False, connection.alias)
+        self.assertEqual(found('пропущенный'), [post.id])
+        added = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(found('новый'), [added.id])
+
+    def test_rebuild_search(self):
+        """Команда rebuild_search восстанавливает индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+        self.assertEqual(found('собака'), [])
+        call_command('rebuild_search', stdout=StringIO())
+        self.assertEqual(
+            Post.objects.get(id__in=found('собака')).text, 'Собака лает'
+        )
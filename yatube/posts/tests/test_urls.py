@@ -16,6 +16,7 @@ LOGIN = reverse('users:login')
 PROFILE_FOLLOW = reverse('posts:profile_follow', args=[USERNAME])
 PROFILE_UNFOLLOW = reverse('posts:profile_unfollow', args=[USERNAME])
 FOLLOW = reverse('posts:follow_index')
+SEARCH = reverse('posts:search')
 REDIRECT_PROFILE_FOLLOW = f'{LOGIN}?next={PROFILE_FOLLOW}'
 REDIRECT_FOLLOW = f'{LOGIN}?next={FOLLOW}'
 REDIRECT_PROFILE_UNFOLLOW = f'{LOGIN}?next={PROFILE_UNFOLLOW}'
@@ -41,6 +42,9 @@ class PostsURLTests(TestCase):
         )
         cls.POST_EDIT = reverse('posts:post_edit', args=[cls.post.id])
         cls.POST_DETAIL = reverse('posts:post_detail', args=[cls.post.id])
+        cls.POST_COMMENTS = reverse(
+            'posts:post_comments', args=[cls.post.id]
+        )
         cls.REDIRECT_POST_CREATE = f'{LOGIN}?next={POST_CREATE}'
         cls.REDIRECT_POST_EDIT = f'{LOGIN}?next={cls.POST_EDIT}'
 
@@ -52,9 +56,11 @@ class PostsURLTests(TestCase):
         """Доступ страниц пользователям."""
         cases = [
             [INDEX, self.guest, 200],
+            [SEARCH, self.guest, 200],
             [GROUP_LIST, self.guest, 200],
             [PROFILE, self.guest, 200],
             [self.POST_DETAIL, self.guest, 200],
+            [self.POST_COMMENTS, self.guest, 200],
             [UNEXIST_PAGE, self.guest, 404],
             [POST_CREATE, self.another, 200],
             [POST_CREATE, self.guest, 302],
@@ -85,9 +91,14 @@ class PostsURLTests(TestCase):
         cases = [
             [self.POST_EDIT, self.author_client, 'posts/create_post.html'],
             [INDEX, self.another, 'posts/index.html'],
+            [SEARCH, self.another, 'posts/search.html'],
             [GROUP_LIST, self.another, 'posts/group_list.html'],
             [PROFILE, self.another, 'posts/profile.html'],
             [self.POST_DETAIL, self.another, 'posts/post_detail.html'],
+            [
+                self.POST_COMMENTS, self.another,
+                'posts/includes/comment_list.html'
+            ],
             [POST_CREATE, self.another, 'posts/create_post.html'],
             [FOLLOW, self.another, 'posts/follow.html'],
         ]
@@ -1,12 +1,24 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..constants import POSTS_NUMBER
-from ..models import Follow, Group, Post, User
+from .. import thumbnails
+from ..constants import (COMMENTS_NUMBER, POSTS_NUMBER, THUMBNAIL_VARIANTS,
+                         THUMBNAIL_WIDTHS)
+from ..models import Comment, Follow, Group, Post, Timeline, User
+from ..paginators import NEXT, PREVIOUS, encode_cursor
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 REST_POSTS = 3
+LISTING_QUERIES_LIMIT = 8
 SLUG = 'test_slug'
 SLUG_2 = 'test_slug_2'
 USERNAME = 'auth'
@@ -27,6 +39,7 @@ SMALL_GIF = (
 )
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -59,6 +72,11 @@ class PostPagesTests(TestCase):
         )
         cls.POST_DETAIL = reverse('posts:post_detail', args=[cls.post.id])
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         cache.clear()
 
@@ -119,13 +137,41 @@ class PostPagesTests(TestCase):
     def test_cache_index(self):
         """Тест кэширования страницы index"""
         first_request = self.another.get(INDEX)
-        Post.objects.all().delete()
-        second_request = self.another.get(INDEX)
+        with CaptureQueriesContext(connection) as queries:
+            second_request = self.another.get(INDEX)
         self.assertEqual(first_request.content, second_request.content)
-        cache.clear()
+        self.assertFalse(
+            [query for query in queries if 'posts_post' in query['sql']]
+        )
+        Post.objects.all().delete()
         third_request = self.another.get(INDEX)
         self.assertNotEqual(first_request.content, third_request.content)
 
+    def test_cache_is_reset_by_changes(self):
+        """Кэш лент сбрасывается изменениями постов, групп и подписок."""
+        cases = [
+            (INDEX, lambda: Post.objects.create(
+                text='Новый пост', author=self.user)),
+            (GROUP_LIST, lambda: Group.objects.filter(pk=self.group.pk)
+                .first().save()),
+            (GROUP_LIST, lambda: Post.objects.create(
+                text='Новый пост', author=self.user, group=self.group)),
+            (PROFILE, lambda: Follow.objects.create(
+                user=self.user, author=self.author)),
+            (PROFILE, lambda: Post.objects.filter(
+                author=self.author).delete()),
+        ]
+        for url, change in cases:
+            with self.subTest(url=url):
+                self.another.get(url)
+                change()
+                with CaptureQueriesContext(connection) as queries:
+                    self.another.get(url)
+                self.assertTrue(
+                    [query for query in queries
+                     if 'posts_post' in query['sql']]
+                )
+
     def test_author_client_add_delete_subscription_to_the_author(self):
         """Авторизованный пользователь может подписываться
         на других пользователей."""
@@ -176,3 +222,246 @@ class PostPagesTests(TestCase):
                     len(self.another.get(url).context['page_obj']),
                     number_posts
                 )
+
+    def test_timeline_follows_subscriptions(self):
+        """Лента подписки заполняется при подписке и публикации поста
+        и очищается при отписке."""
+        self.another.get(PROFILE_FOLLOW)
+        self.assertTrue(
+            Timeline.objects.filter(user=self.user, post=self.post).exists()
+        )
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            list(self.another.get(FOLLOW).context['page_obj']),
+            [new_post, self.post]
+        )
+        self.another.get(PROFILE_UNFOLLOW)
+        self.assertFalse(Timeline.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            len(self.another.get(FOLLOW).context['page_obj']), 0
+        )
+
+    def test_cursor_pagination(self):
+        """Курсоры листают ленту вперед и назад без пропусков и повторов."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Тестовый пост {count}')
+            for count in range(POSTS_NUMBER + REST_POSTS)
+        )
+        first_page = self.another.get(INDEX).context['page_obj']
+        second_page = self.another.get(
+            f'{INDEX}?cursor={first_page.next_cursor}'
+        ).context['page_obj']
+        self.assertEqual(second_page.number, 2)
+        self.assertFalse(second_page.has_next())
+        self.assertEqual(len(second_page), REST_POSTS + 1)
+        self.assertEqual(
+            list(first_page) + list(second_page),
+            list(Post.objects.order_by('-pub_date', '-id'))
+        )
+        previous_page = self.another.get(
+            f'{INDEX}?cursor={second_page.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(previous_page.number, 1)
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertEqual(
+            list(self.another.get(f'{INDEX}?cursor=broken')
+                 .context['page_obj']),
+            list(first_page)
+        )
+
+    def test_tampered_cursor_leads_to_first_page(self):
+        """Курсор правильного вида с негодными значениями ведет на первую
+        страницу, а не к ошибке сервера."""
+        first_page = list(self.another.get(INDEX).context['page_obj'])
+        search = reverse('posts:search')
+        for values in (['garbage', 5], ['2024-01-01T00:00:00', 'x'],
+                       [None, 5], [[1], {'a': 1}]):
+            for direction in (NEXT, PREVIOUS):
+                cursor = encode_cursor(direction, 2, values)
+                with self.subTest(values=values, direction=direction):
+                    response = self.another.get(INDEX, {'cursor': cursor})
+                    self.assertEqual(
+                        list(response.context['page_obj']), first_page
+                    )
+                    self.assertEqual(self.another.get(
+                        search, {'q': 'Тестовый', 'cursor': cursor}
+                    ).status_code, 200)
+
+    def test_paginator_renders_page_window(self):
+        """Паджинатор выводит окно номеров страниц, а не все страницы."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Тестовый пост {count}')
+            for count in range(POSTS_NUMBER * 20)
+        )
+        response = self.another.get(f'{INDEX}?page=10')
+        page = response.context['page_obj']
+        self.assertEqual(
+            list(page.elided_page_range),
+            [1, page.paginator.ELLIPSIS, 8, 9, 10, 11, 12,
+             page.paginator.ELLIPSIS, 21]
+        )
+        self.assertNotContains(response, '?page=15"')
+        self.assertContains(response, '?page=21"')
+
+    def test_listing_queries_do_not_grow_with_posts(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        Post.objects.bulk_create(
+            Post(author=self.author, group=self.group,
+                 text=f'Тестовый пост {count}')
+            for count in range(POSTS_NUMBER * 2)
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+        for url in (INDEX, GROUP_LIST, PROFILE, FOLLOW):
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.another.get(url)
+                self.assertLessEqual(len(queries), LISTING_QUERIES_LIMIT)
+
+    def test_post_detail_comments_are_paginated(self):
+        """Комментарии выводятся страницами, остальные - по курсору."""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Коммент {count}')
+            for count in range(COMMENTS_NUMBER + REST_POSTS)
+        )
+        comments = self.another.get(self.POST_DETAIL).context['comments']
+        self.assertEqual(len(comments), COMMENTS_NUMBER)
+        rest = self.another.get(
+            reverse('posts:post_comments', args=[self.post.id]),
+            {'cursor': comments.next_cursor}
+        ).context['comments']
+        self.assertEqual(len(rest), REST_POSTS)
+        self.assertFalse(rest.has_next())
+        self.assertEqual(
+            list(comments) + list(rest),
+            list(self.post.comments.order_by('-pub_date', '-id'))
+        )
+        oldest = self.another.get(
+            self.POST_DETAIL, {'order': 'oldest'}
+        ).context['comments']
+        self.assertEqual(
+            list(oldest),
+            list(self.post.comments.order_by('pub_date', 'id')
+                 [:COMMENTS_NUMBER])
+        )
+
+    def test_conditional_get(self):
+        """Неизменившиеся страницы отдаются ответом 304 без запросов
+        к постам."""
+        for url in (INDEX, GROUP_LIST, PROFILE, self.POST_DETAIL):
+            with self.subTest(url=url):
+                etag = self.another.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.another.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(
+                    [query for query in queries
+                     if 'posts_' in query['sql']]
+                )
+                self.assertNotEqual(
+                    self.author_client.get(url)['ETag'], etag
+                )
+                Comment.objects.create(
+                    post=self.post, author=self.author, text='Комментарий'
+                )
+                Post.objects.create(
+                    text='Новый пост', author=self.author, group=self.group
+                )
+                self.assertEqual(
+                    self.another.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    ).status_code,
+                    200
+                )
+
+    def test_missing_image_file_does_not_break_pages(self):
+        """Пост, у которого пропал файл картинки, не ломает страницы."""
+        post = Post.objects.create(text='Пост без файла', author=self.author)
+        Post.objects.filter(pk=post.pk).update(image='posts/missing.gif')
+        for url in (INDEX, PROFILE,
+                    reverse('posts:post_detail', args=[post.id])):
+            with self.subTest(url=url):
+                self.assertEqual(self.another.get(url).status_code, 200)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_broken_image_is_not_rescheduled(self):
+        """Неудачное построение миниатюр запоминается, и битая картинка
+        не ставится в очередь при каждой отрисовке."""
+        post = Post.objects.create(text='Пост без файла', author=self.author)
+        Post.objects.filter(pk=post.pk).update(image='posts/missing.gif')
+        with mock.patch.object(
+            thumbnails, 'generate', side_effect=thumbnails.generate
+        ) as generate, self.assertLogs(thumbnails.logger, 'ERROR'):
+            for url in (INDEX, PROFILE,
+                        reverse('posts:post_detail', args=[post.id])):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.another.get(url)
+        self.assertEqual(
+            generate.call_args_list.count(mock.call('posts/missing.gif')), 1
+        )
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_thumbnails_are_pregenerated(self):
+        """Варианты картинки строятся после сохранения поста, а до этого
+        страница показывает заглушку. Ширины больше исходной картинки
+        в srcset не попадают."""
+        image = SimpleUploadedFile(
+            name='thumbnail.gif', content=SMALL_GIF, content_type='image/gif'
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            post = Post.objects.create(
+                text='Пост с картинкой', author=self.author, image=image
+            )
+        post_detail = reverse('posts:post_detail', args=[post.id])
+        for variant in THUMBNAIL_VARIANTS:
+            self.assertIsNone(thumbnails.get_ready(post.image.name, variant))
+        placeholder = self.another.get(post_detail)
+        self.assertContains(placeholder, 'bg-light')
+        self.assertNotContains(self.another.get(INDEX), 'type="image/webp"')
+        for callback in callbacks:
+            callback()
+        self.assertContains(self.another.get(INDEX), 'type="image/webp"')
+        self.assertEqual(self.another.get(
+            post_detail, HTTP_IF_NONE_MATCH=placeholder['ETag']
+        ).status_code, 200)
+        response = self.another.get(post_detail)
+        for variant in THUMBNAIL_VARIANTS:
+            with self.subTest(variant=variant):
+                thumbnail = thumbnails.get_ready(post.image.name, variant)
+                self.assertIsNotNone(thumbnail)
+                if variant[0] == THUMBNAIL_WIDTHS[0]:
+                    self.assertContains(
+                        response, f'{thumbnail.url} {variant[0]}w'
+                    )
+                else:
+                    self.assertNotContains(response, thumbnail.url)
+        self.assertContains(response, 'type="image/webp"')
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_thumbnails_are_looked_up_once_per_page(self):
+        """Миниатюры всех постов страницы ищутся одним запросом."""
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(REST_POSTS):
+                Post.objects.create(
+                    text=f'Пост с картинкой {number}',
+                    author=self.author,
+                    image=SimpleUploadedFile(
+                        name=f'lookup_{number}.gif',
+                        content=SMALL_GIF,
+                        content_type='image/gif'
+                    )
+                )
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.another.get(INDEX)
+        self.assertEqual(
+            len([query for query in queries
+                 if 'thumbnail_kvstore' in query['sql']]),
+            1
+        )
+        for post in response.context['page_obj']:
+            with self.subTest(post=post.text):
+                self.assertEqual(
+                    set(post._prefetched_thumbnails.values()) == {None},
+                    post == self.post
+                )
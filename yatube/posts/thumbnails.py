@@ -0,0 +1,210 @@
+"""Фоновое построение миниатюр картинок постов.
+
+Все варианты миниатюр из THUMBNAIL_VARIANTS (ширины для srcset в WebP и
+запасной JPEG) строятся в пуле процессов после сохранения поста. Шаблоны
+только читают готовые миниатюры из хранилища sorl-thumbnail и не строят
+их во время запроса. Когда миниатюры готовы, сбрасываются кэш и ETag
+страниц, которые могли сохранить заглушку. Неудача запоминается на
+THUMBNAIL_FAILURE_TIMEOUT, чтобы битая картинка не ставилась в очередь
+при каждой отрисовке страницы.
+"""
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from core.cache import bump
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .constants import THUMBNAIL_FAILURE_TIMEOUT, THUMBNAIL_VARIANTS
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def thumbnail_file(name, variant):
+    """Файл миниатюры с теми же именем и ключом, что дает get_thumbnail."""
+    backend = default.backend
+    source = ImageFile(name)
+    geometry, options = THUMBNAIL_VARIANTS[variant]
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage
+    )
+
+
+def kvstore_key(thumbnail):
+    return add_prefix(thumbnail.key)
+
+
+def get_ready(name, variant):
+    """Готовая миниатюра или None, если она еще строится.
+
+    Промах не запоминается в кэше: миниатюру строит другой процесс.
+    """
+    key = kvstore_key(thumbnail_file(name, variant))
+    value = default.kvstore.cache.get(key)
+    if not isinstance(value, str):
+        value = KVStore.objects.filter(key=key).values_list(
+            'value', flat=True
+        ).first()
+        if value is None:
+            return None
+        default.kvstore.cache.set(
+            key, value, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+    return deserialize_image_file(value)
+
+
+def prefetch(posts):
+    """Находит готовые миниатюры для всех постов страницы разом.
+
+    Одно обращение к кэшу (get_many) и не больше одного запроса к базе
+    на страницу; результаты сохраняются в посты для тега post_thumbnail.
+    """
+    keys = {}
+    for post in posts:
+        post._prefetched_thumbnails = {}
+        if post.image:
+            for variant in THUMBNAIL_VARIANTS:
+                key = kvstore_key(thumbnail_file(post.image.name, variant))
+                keys.setdefault(key, []).append((post, variant))
+    if not keys:
+        return
+    cache = default.kvstore.cache
+    values = {
+        key: value for key, value in cache.get_many(list(keys)).items()
+        if isinstance(value, str)
+    }
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStore.objects.filter(key__in=missing).values_list('key', 'value')
+        )
+        if found:
+            cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    for key, targets in keys.items():
+        thumbnail = (
+            deserialize_image_file(values[key]) if key in values else None
+        )
+        for post, variant in targets:
+            post._prefetched_thumbnails[variant] = thumbnail
+
+
+def generate(name):
+    """Строит все миниатюры картинки (выполняется в пуле процессов).
+
+    sorl-thumbnail не бросает исключений, если исходник пропал или не
+    читается, а просто не сохраняет миниатюру; это считается ошибкой.
+    """
+    for geometry, options in THUMBNAIL_VARIANTS.values():
+        thumbnail = get_thumbnail(name, geometry, **options)
+        if default.kvstore.get(thumbnail) is None:
+            raise OSError(f'Не удалось прочитать картинку {name}')
+    return name
+
+
+def reset_pages(name):
+    """Сбрасывает страницы с постами картинки name."""
+    scopes = {'posts'}
+    for post_id, username, slug in Post.objects.filter(
+        image=name
+    ).values_list('id', 'author__username', 'group__slug'):
+        scopes.update({f'post:{post_id}', f'profile:{username}'})
+        if slug:
+            scopes.add(f'group:{slug}')
+    bump(*scopes)
+
+
+def failure_key(name):
+    return 'thumbnails:failed:{}'.format(
+        hashlib.md5(name.encode()).hexdigest()
+    )
+
+
+def _failed(name, error):
+    logger.error('Не удалось построить миниатюры %s', name, exc_info=error)
+    cache.set(failure_key(name), True, THUMBNAIL_FAILURE_TIMEOUT)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup
+        )
+    return _executor
+
+
+def _done(future, name):
+    global _executor
+    with _lock:
+        _pending.discard(name)
+        if isinstance(future.exception(), BrokenProcessPool):
+            _executor = None
+    if future.exception() is not None:
+        _failed(name, future.exception())
+        return
+    # Колбэк выполняется в служебном потоке пула со своим соединением.
+    try:
+        reset_pages(name)
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def _submit(name):
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    if not settings.THUMBNAIL_WORKERS:
+        try:
+            generate(name)
+            reset_pages(name)
+        except Exception as error:
+            _failed(name, error)
+        finally:
+            with _lock:
+                _pending.discard(name)
+        return
+    get_executor().submit(generate, name).add_done_callback(
+        lambda future: _done(future, name)
+    )
+
+
+def schedule(name):
+    """Ставит построение миниатюр в очередь после фиксации транзакции.
+
+    Картинки, для которых построение недавно не удалось, пропускаются.
+    """
+    if cache.get(failure_key(name)):
+        return
+    transaction.on_commit(lambda: _submit(name))
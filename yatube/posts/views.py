@@ -1,37 +1,75 @@
+from core.cache import versioned_cache_page, versioned_etag
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db.models import F
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
-from .constants import POSTS_NUMBER
+from . import search as fts
+from . import thumbnails
+from .constants import COMMENTS_NUMBER, POSTS_NUMBER
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-
-
-def page_obj(request, post_list):
-    return Paginator(post_list, POSTS_NUMBER).get_page(request.GET.get('page'))
+from .models import Follow, Group, Post, SearchEntry, User, UserStats
+from .paginators import CursorPaginator
+
+
+def page_obj(request, post_list, keys=('pub_date', 'id'), estimate=False):
+    paginator = CursorPaginator(post_list, POSTS_NUMBER, keys, estimate)
+    if 'page' in request.GET:
+        page = paginator.get_page(request.GET['page'])
+    elif 'cursor' in request.GET:
+        page = paginator.get_cursor_page(request.GET['cursor'])
+    else:
+        page = paginator.first_page()
+    page.object_list = list(page.object_list)
+    thumbnails.prefetch(page.object_list)
+    return page
+
+
+def comments_page(request, post):
+    paginator = CursorPaginator(
+        post.comments.select_related('author').only(
+            'text', 'pub_date', 'post', 'author', 'author__username'
+        ),
+        COMMENTS_NUMBER,
+        descending=request.GET.get('order') != 'oldest'
+    )
+    if 'cursor' in request.GET:
+        return paginator.get_cursor_page(request.GET['cursor'])
+    return paginator.first_page()
 
 
-@cache_page(20, key_prefix='index_page')
+@versioned_etag('posts')
+@versioned_cache_page('posts', timeout=settings.PAGE_CACHE_TIMEOUT)
 def index(request):
     return render(request, 'posts/index.html', {
-        'page_obj': page_obj(request, Post.objects.all())
+        'page_obj': page_obj(
+            request, Post.objects.for_listing(), estimate=True
+        )
     })
 
 
+@versioned_etag('group:{slug}')
+@versioned_cache_page(
+    'group:{slug}', timeout=settings.PAGE_CACHE_TIMEOUT
+)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', {
         'group': group,
-        'page_obj': page_obj(request, group.posts.all())
+        'page_obj': page_obj(request, group.posts.for_listing())
     })
 
 
+@versioned_etag('profile:{username}')
+@versioned_cache_page(
+    'profile:{username}', timeout=settings.PAGE_CACHE_TIMEOUT
+)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     return render(request, 'posts/profile.html', {
-        'page_obj': page_obj(request, author.posts.all()),
+        'page_obj': page_obj(request, author.posts.for_listing()),
         'author': author,
+        'stats': UserStats.objects.for_user(author),
         'following': (request.user.is_authenticated
                       and author != request.user
                       and Follow.objects.filter(
@@ -40,13 +78,57 @@ def profile(request, username):
     })
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = CursorPaginator(
+        SearchEntry.objects.ranked(query),
+        POSTS_NUMBER,
+        keys=('search_rank', 'post_id'),
+        descending=False
+    )
+    if 'cursor' in request.GET:
+        page = paginator.get_cursor_page(request.GET['cursor'])
+    else:
+        page = paginator.first_page()
+    ids = [hit['post_id'] for hit in page]
+    found = Post.objects.for_listing().in_bulk(ids)
+    posts = [found[post_id] for post_id in ids if post_id in found]
+    thumbnails.prefetch(posts)
+    snippets = fts.snippets(query, ids)
+    for post in posts:
+        post.snippet, post.snippet_in_comment = snippets.get(
+            post.id, (None, False)
+        )
+    return render(request, 'posts/search.html', {
+        'page_obj': page,
+        'posts': posts,
+        'query': query,
+    })
+
+
+@versioned_etag('posts', 'post:{post_id}')
 def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id
+    )
     return render(request, 'posts/post_detail.html', {
-        'post': get_object_or_404(Post, id=post_id),
+        'post': post,
+        'stats': UserStats.objects.for_user(post.author),
+        'comments': comments_page(request, post),
+        'order': request.GET.get('order'),
         'form': CommentForm(),
     })
 
 
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    return render(request, 'posts/includes/comment_list.html', {
+        'post': post,
+        'comments': comments_page(request, post),
+        'order': request.GET.get('order'),
+    })
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST, files=request.FILES or None)
@@ -93,9 +175,14 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_list = Post.objects.for_listing().filter(
+        timeline_entries__user=request.user
+    ).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_id=F('timeline_entries__id')
+    )
     return render(request, 'posts/follow.html', {
-        'page_obj': page_obj(request, post_list)
+        'page_obj': page_obj(request, post_list, ('feed_date', 'feed_id'))
     })
 
 
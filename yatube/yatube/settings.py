@@ -46,16 +46,49 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Заголовок Server-Timing с замерами запроса (см. core.timing).
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True') == 'True'
+# Запросы дольше этого пишутся в журнал core.timing с уровнем WARNING.
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+# Каталог файлов метрик воркеров (core.metrics); без него метрики
+# хранятся в памяти процесса. Очищайте его при перезапуске сервера.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+# /metrics доступен с заголовком «Authorization: Bearer METRICS_TOKEN».
+# Адреса METRICS_ALLOWED_IPS сверяются с REMOTE_ADDR и годятся, только
+# если сервер доступен не через прокси: за ним все клиенты приходят с
+# адреса прокси. Без токена и адресов метрики не отдаются.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip
+]
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
@@ -66,7 +99,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -91,9 +124,45 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живет между запросами (секунд; 0 - на каждый запрос).
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Реплика для чтения лент: копия основной базы, которую обновляет
+# команда sync_replica (см. core.routers).
+DB_REPLICA_NAME = os.getenv('DB_REPLICA_NAME')
+
+if DB_REPLICA_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA_NAME,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Представления, которые читают посты с реплики.
+REPLICA_VIEWS = {
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:follow_index',
+}
+# Сколько секунд после записи пользователь читает только основную базу.
+REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 30))
+
+# PRAGMA для каждого нового соединения SQLite (см. core.db).
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -20000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -146,6 +215,10 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 IMAGES_DIRECTORY = 'posts/'
 
+# Число процессов, заранее строящих миниатюры картинок постов
+# (0 - строить в том же процессе).
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 CACHES = {
@@ -154,4 +227,26 @@ CACHES = {
     }
 }
 
+# Общий для всех воркеров кэш в файле SQLite (core.cache_backends).
+CACHE_LOCATION = os.getenv('CACHE_LOCATION')
+
+if CACHE_LOCATION:
+    CACHES['default'] = {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': CACHE_LOCATION,
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+            'MAX_SIZE': int(os.getenv('CACHE_MAX_SIZE', 256 * 1024 * 1024)),
+        },
+    }
+
+# Версии областей кэша страниц (core.cache) видны всем воркерам только в
+# общем кэше. В кэше процесса и версии, и страницы живут недолго, чтобы
+# изменения, сделанные в другом воркере, появлялись не позже.
+PAGE_CACHE_TIMEOUT = int(os.getenv(
+    'PAGE_CACHE_TIMEOUT', 60 * 60 * 24 if CACHE_LOCATION else 20
+))
+CACHE_VERSION_TIMEOUT = None if CACHE_LOCATION else PAGE_CACHE_TIMEOUT
+
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'